@@ -0,0 +1,66 @@
+"""
+Per-page time of the streaming XML serializer against the ElementTree reference.
+
+Usage (from the repository root):
+    python3 -m benchmarks.bench_xml [--pages 50] [--words-per-page 300] [--repeat 5]
+"""
+import argparse
+import random
+import timeit
+
+from helper.xml_generator import generate_xml_content, generate_xml_content_etree
+
+WORDS_FILE = "Khmer Dictionary 2022.txt"
+
+
+def make_pages(num_pages: int, words_per_page: int, words_per_line: int = 12, seed: int = 0) -> list:
+    """Synthetic `lines` arguments shaped like the ones draw_texts_on_image returns"""
+    rng = random.Random(seed)
+    try:
+        with open(WORDS_FILE, encoding="utf-8") as f:
+            words = f.read().splitlines()
+    except FileNotFoundError:
+        words = ["".join(chr(rng.randint(0x1780, 0x17D2)) for _ in range(5)) for _ in range(1000)]
+
+    pages = []
+    for _ in range(num_pages):
+        lines = []
+        for start in range(0, words_per_page, words_per_line):
+            y = rng.randint(0, 700)
+            lines.append([
+                (rng.choice(words), (rng.randint(0, 900), y, rng.randint(20, 200), rng.randint(20, 80)))
+                for _ in range(min(words_per_line, words_per_page - start))
+            ])
+        pages.append(lines)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VOC XML serialization per page.")
+    parser.add_argument("--pages", type=int, default=50, help="Number of synthetic pages (default: 50).")
+    parser.add_argument("--words-per-page", type=int, default=300, help="Words on each page (default: 300).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions; the best one is reported (default: 5).")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.words_per_page)
+    size = (1000, 750)
+
+    for lines in pages:
+        assert generate_xml_content(lines, "img_00000.png", size) == generate_xml_content_etree(lines, "img_00000.png", size)
+
+    candidates = {
+        "etree (reference)": lambda: [generate_xml_content_etree(lines, "img_00000.png", size) for lines in pages],
+        "streaming, pretty": lambda: [generate_xml_content(lines, "img_00000.png", size) for lines in pages],
+        "streaming, compact": lambda: [generate_xml_content(lines, "img_00000.png", size, pretty=False) for lines in pages],
+    }
+
+    print(f"{args.pages} pages x {args.words_per_page} words, best of {args.repeat}")
+    baseline = None
+    for name, fn in candidates.items():
+        per_page = min(timeit.repeat(fn, number=1, repeat=args.repeat)) / args.pages
+        baseline = baseline or per_page
+        print(f"{name:<20} {per_page * 1000:8.3f} ms/page  {baseline / per_page:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
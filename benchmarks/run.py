@@ -0,0 +1,329 @@
+"""
+Benchmark suite of the generator's hot paths.
+
+End-to-end pages/sec (`main.generate_sample` into the null sink, so
+without encoding or I/O) plus micro-benchmarks of khnormal, text drawing,
+every augmentation, YOLO conversion, XML serialization, contrast colors
+and image encoding. Inputs are rendered from the bundled fonts/ and
+background/ with per-sample seeded streams (see helper/rng.py), so every
+run measures exactly the same work. Each benchmark runs once to warm the
+caches and is then timed `--repeat` times; the best run is what
+`--compare` checks against the baseline.
+
+Usage (from the repository root):
+    python3 -m benchmarks.run -o baseline.json
+    python3 -m benchmarks.run --compare baseline.json [--threshold 0.1]
+    python3 -m benchmarks.run --only augment --only xml
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable
+
+from helper import profiling
+from helper.image_processing import apply_artifact, apply_color_jitter, apply_motion_blur, rand_brightness_contrast
+
+DEFAULT_SEED = 1234
+# Stream indices of the inputs that are not pages, far above any page index
+WORDS_STREAM = 2 ** 32
+COLORS_STREAM = 2 ** 32 + 1
+
+# name -> (unit, factory); a factory returns (function timing one run, items processed per run)
+BENCHMARKS: dict[str, tuple[str, Callable[["Inputs"], tuple[Callable[[], object], int]]]] = {}
+
+
+def benchmark(name: str, unit: str):
+    def register(factory):
+        BENCHMARKS[name] = (unit, factory)
+        return factory
+    return register
+
+
+class Inputs:
+    """Deterministic inputs shared by the benchmarks, rendered once from the configured assets"""
+
+    def __init__(self, seed: int, pages: int):
+        import main
+        from helper.rng import sample_rng
+
+        self.main = main
+        self.seed = seed
+        self.pages = pages
+        self.rng = lambda index: sample_rng(seed, index)
+
+        # Un-augmented pages with their boxes and XML lines
+        self.page_images = []
+        self.page_lines = []
+        self.page_boxes = []
+        for index in range(pages):
+            img, lines, boxes = main.create_text_image_with_bbox(rng=self.rng(index))
+            self.page_images.append(img)
+            self.page_lines.append(lines)
+            self.page_boxes.append(boxes)
+
+        words_rng = self.rng(WORDS_STREAM)
+        self.words = [words_rng.choice(main.TEXT_WORDS) for _ in range(2000)]
+
+    def backgrounds(self) -> list:
+        main = self.main
+        from helper.get_random import get_random_background
+        return [get_random_background(main.IMAGE_SIZE, main.BACKGROUND_IMAGES_DIR, main.MIN_IMG_SCALE, main.MAX_IMG_SCALE,
+                                      pool=main.get_background_pool(), rng=self.rng(index))
+                for index in range(self.pages)]
+
+
+@benchmark("pages", "page")
+def bench_pages(inputs: Inputs):
+    main = inputs.main
+    indices = range(inputs.pages)
+
+    def run():
+        for index in indices:
+            main.generate_sample(index)
+    return run, len(indices)
+
+
+@benchmark("khnormal", "word")
+def bench_khnormal(inputs: Inputs):
+    from helper.khnormal import khnormal_word
+    normalize = khnormal_word.__wrapped__  # bypass the lru_cache
+    words = inputs.words
+
+    def run():
+        for word in words:
+            normalize(word)
+    return run, len(words)
+
+
+@benchmark("draw_texts_on_image", "page")
+def bench_draw_texts(inputs: Inputs):
+    from helper.khnormal import khnormal_word
+    main = inputs.main
+    backgrounds = inputs.backgrounds()
+    words = [khnormal_word(w) for w in inputs.words[:400]]
+
+    def run():
+        for index, bg in enumerate(backgrounds):
+            main.draw_texts_on_image(
+                bg.copy(), iter(words), main.FONT_DIR,
+                main.MIN_IMG_PADDING, main.MAX_IMG_PADDING,
+                main.MIN_LINE_SPACING, main.MAX_LINE_SPACING,
+                main.MIN_FONT_SIZE, main.MAX_FONT_SIZE,
+                main.MIN_WORD_PADDING, main.MAX_WORD_PADDING,
+                main.POSSIBILITIES_FOR_NEW_PADDING,
+                main.POSSIBILITIES_FOR_NEW_LINE_SPACING,
+                main.POSSIBILITIES_FOR_NEW_WORD_PADDING,
+                main.POSSIBILITIES_FOR_NEW_FONT_SIZE,
+                main.POSSIBILITIES_FOR_NEW_FONT,
+                main.POSSIBILITIES_FOR_NEW_Y, main.NEW_Y_RANGE,
+                main.POSSIBILITIES_FOR_NEW_X, main.NEW_X_RANGE,
+                main.POSSIBILITIES_FOR_NEW_COLOR,
+                main.BBOX_WIDTH_PADDING, main.BBOX_HEIGHT_PADDING,
+                render_mode=main.TEXT_RENDER_MODE,
+                color_mode=main.TEXT_COLOR_MODE,
+                rng=inputs.rng(index),
+            )
+    return run, len(backgrounds)
+
+
+def _augmentation(name: str, apply: Callable) -> None:
+    """Register a benchmark running `apply(main, img, rng)` on every page"""
+    def factory(inputs: Inputs):
+        images = inputs.page_images
+
+        def run():
+            for index, img in enumerate(images):
+                apply(inputs.main, img, inputs.rng(index))
+        return run, len(images)
+    benchmark(name, "page")(factory)
+
+
+# Every op is forced on (possibility 1.0); the pipeline uses the configured possibilities
+_augmentation("augment.motion_blur", lambda main, img, rng: apply_motion_blur(img, main.MOTION_BLUR_KERNEL_SIZE_RANGE, 1.0, rng=rng))
+_augmentation("augment.artifact", lambda main, img, rng: apply_artifact(img, main.JPEG_COMPRESSION_RANGE, 1.0, rng=rng))
+_augmentation("augment.brightness_contrast", lambda main, img, rng: rand_brightness_contrast(img, main.ALPHA_RANGE, main.BETA_RANGE, rng=rng))
+_augmentation("augment.color_jitter", lambda main, img, rng: apply_color_jitter(img, 1.0, main.HUE_DELTA, main.SAT_SCALE, main.VAL_SCALE, rng=rng))
+_augmentation("augment.pipeline", lambda main, img, rng: main.AUGMENTATION.run(img, rng))
+
+
+@benchmark("yolo.convert_to_yolo_format", "page")
+def bench_yolo_list(inputs: Inputs):
+    from helper.utils import format_label
+    from helper.yolo_coord import convert_to_yolo_format
+    pages = list(zip(inputs.page_images, inputs.page_boxes))
+    target = inputs.main.IMAGE_SIZE
+
+    def run():
+        for img, boxes in pages:
+            format_label(convert_to_yolo_format(boxes, img.width, img.height, target))
+    return run, len(pages)
+
+
+@benchmark("yolo.convert_to_yolo_array", "page")
+def bench_yolo_array(inputs: Inputs):
+    from helper.utils import format_label
+    from helper.yolo_coord import convert_to_yolo_array
+    pages = list(zip(inputs.page_images, inputs.page_boxes))
+    target = inputs.main.IMAGE_SIZE
+
+    def run():
+        for img, boxes in pages:
+            format_label(convert_to_yolo_array(boxes, img.width, img.height, target))
+    return run, len(pages)
+
+
+@benchmark("generate_xml_content", "page")
+def bench_xml(inputs: Inputs):
+    from helper.xml_generator import generate_xml_content
+    pages = list(zip(inputs.page_images, inputs.page_lines))
+    pretty = inputs.main.XML_PRETTY
+
+    def run():
+        for img, lines in pages:
+            generate_xml_content(lines, "img_00000.png", img.size, pretty=pretty)
+    return run, len(pages)
+
+
+@benchmark("get_contrast_color", "word")
+def bench_contrast_color(inputs: Inputs):
+    from helper.get_color import get_contrast_color
+    pages = list(zip(inputs.page_images, inputs.page_boxes))
+    rng = inputs.rng(COLORS_STREAM)
+
+    def run():
+        # A fresh copy per page, so the summed-area table is built once per page as during generation
+        for img, boxes in pages:
+            img = img.copy()
+            for x, y, w, h in boxes:
+                get_contrast_color(img, int(x), int(y), max(int(w), 1), max(int(h), 1), rng=rng)
+    return run, sum(len(boxes) for _, boxes in pages)
+
+
+@benchmark("encode", "page")
+def bench_encode(inputs: Inputs):
+    encoder = inputs.main.IMAGE_ENCODER
+    images = inputs.page_images
+
+    def run():
+        for img in images:
+            encoder.encode(img)
+    return run, len(images)
+
+
+def time_benchmark(fn: Callable[[], object], items: int, repeat: int, min_run_seconds: float = 0.2) -> dict:
+    """
+    Best and median time per item over `repeat` runs. Fast benchmarks call
+    `fn` several times per run, so that a run takes at least `min_run_seconds`.
+    """
+    started = time.perf_counter()
+    fn()  # warm up fonts, glyph metrics, sprites and the background pool
+    warm_up = time.perf_counter() - started
+    loops = max(1, int(min_run_seconds / warm_up)) if warm_up > 0 else 1
+
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        runs.append((time.perf_counter() - started) / loops)
+    best = min(runs) / items
+    return {
+        "items": items,
+        "loops": loops,
+        "best_ms": best * 1000,
+        "median_ms": statistics.median(runs) / items * 1000,
+        "per_second": 1 / best if best > 0 else float("inf"),
+    }
+
+
+def environment(seed: int, pages: int, repeat: int) -> dict:
+    import cv2
+    import numpy
+    import PIL
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "seed": seed, "pages": pages, "repeat": repeat, "commit": commit,
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__, "pillow": PIL.__version__, "opencv": cv2.__version__,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print the change of every benchmark against `baseline`; returns the names slower by more than `threshold`"""
+    regressions = []
+    print(f"\n{'benchmark':<32}{'baseline ms':>13}{'now ms':>11}{'change':>9}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<32}{'-':>13}{result['best_ms']:>11.3f}{'new':>9}")
+            continue
+        change = result["best_ms"] / base["best_ms"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<32}{base['best_ms']:>13.3f}{result['best_ms']:>11.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the generator's hot paths with deterministic inputs.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Seed of the inputs (default: {DEFAULT_SEED}).")
+    parser.add_argument("--pages", type=int, default=10, help="Pages rendered as inputs and per end-to-end run (default: 10).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (default: 5).")
+    parser.add_argument("--only", action="append", default=[], help="Run only benchmarks whose name contains this (repeatable).")
+    parser.add_argument("-o", "--output", default="", help="Save the results as JSON to this path.")
+    parser.add_argument("--compare", default="", help="JSON results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown of the best run that counts as a regression (default: 0.10).")
+    args = parser.parse_args()
+
+    # Render into the null sink on this thread, with every sample on its own seeded stream
+    os.environ["SEED"] = str(args.seed)
+    os.environ["OUTPUT_FORMAT"] = "null"
+    os.environ["OUTPUT_WRITER_THREADS"] = "0"
+    os.environ["PROGRESS_MANIFEST"] = ""
+    profiling.enable(False)
+
+    names = [name for name in BENCHMARKS if not args.only or any(part in name for part in args.only)]
+    if not names:
+        parser.error(f"no benchmark matches {args.only}; available: {', '.join(BENCHMARKS)}")
+
+    print(f"Rendering {args.pages} input pages (seed {args.seed})...")
+    inputs = Inputs(args.seed, args.pages)
+
+    results = {}
+    print(f"{'benchmark':<32}{'unit':>6}{'items':>7}{'best ms':>11}{'median ms':>11}{'per sec':>10}")
+    for name in names:
+        unit, factory = BENCHMARKS[name]
+        fn, items = factory(inputs)
+        result = results[name] = {"unit": unit, **time_benchmark(fn, items, args.repeat)}
+        print(f"{name:<32}{unit:>6}{items:>7}{result['best_ms']:>11.3f}{result['median_ms']:>11.3f}{result['per_second']:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(args.seed, args.pages, args.repeat), "results": results}, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline["environment"]["seed"], baseline["environment"]["pages"]) != (args.seed, args.pages):
+            print("Warning: the baseline was made with a different --seed/--pages; the inputs differ.", file=sys.stderr)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,329 @@
 import os
+import json
+import errno
 import random
 import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-def split_data(train_ratio=0.8):
+import dotenv
+
+from helper.sample_index import read_sample_index
+
+dotenv.load_dotenv()
+
+# === CONFIGURATION ===
+# Source folders: where the generator saved its output (same .env; override with --images/--labels/--xml)
+IMAGE_SOURCE = os.getenv("SAVE_DIR", "synthetic_images/")
+LABEL_SOURCE = os.getenv("LABEL_DIR", "synthetic_labels/")         # For .txt files
+XML_LABEL_SOURCE = os.getenv("XML_DIR", "synthetic_xml_labels/")   # For .xml files
+
+# Define the base output directory
+OUTPUT_BASE = 'data'
+
+# Define file extensions
+IMAGE_EXTS = ('.png', '.jpg', '.webp')
+LABEL_EXT = '.txt'
+XML_EXT = '.xml'
+
+# The split plan, written before any file is touched so an interrupted split can resume
+PLAN_FILENAME = 'split_plan.json'
+# Copies are written under this suffix and renamed into place once complete
+PART_SUFFIX = '.part'
+
+# Written by the generator; read by virtual splits
+SAMPLE_INDEX_FILE = os.getenv("SAMPLE_INDEX_FILE", "synthetic_index.jsonl")
+SPLITS = ('train', 'val', 'test')
+# =====================
+
+
+def scan_files(directory: str) -> dict[str, str]:
+    """Map the base name of every file in `directory` to its file name, with a single scandir pass."""
+    files = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    files[os.path.splitext(entry.name)[0]] = entry.name
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def scan_samples(image_source: str, label_source: str, xml_source: str) -> tuple[dict[str, str], list[str]]:
+    """
+    Find complete samples (image + .txt + .xml with the same base name).
+    Returns {base name: image file name} and the sorted base names of incomplete samples.
+    """
+    images = {base: name for base, name in scan_files(image_source).items() if name.endswith(IMAGE_EXTS)}
+    labels = {base for base, name in scan_files(label_source).items() if name.endswith(LABEL_EXT)}
+    xmls = {base for base, name in scan_files(xml_source).items() if name.endswith(XML_EXT)}
+
+    complete = images.keys() & labels & xmls
+    incomplete = sorted((images.keys() | labels | xmls) - complete)
+    return {base: images[base] for base in complete}, incomplete
+
+
+def plan_split(samples: dict[str, str], ratios: tuple[float, float, float], seed: int) -> dict[str, list[str]]:
+    """Shuffle the image file names with `seed` and cut them into train/val/test by `ratios`."""
+    names = sorted(samples.values())
+    random.Random(seed).shuffle(names)
+
+    total = sum(ratios)
+    train_end = int(len(names) * ratios[0] / total)
+    val_end = train_end + int(len(names) * ratios[1] / total)
+    if ratios[2] == 0:
+        val_end = len(names)  # no test split: rounding leftovers go to val
+    return {"train": names[:train_end], "val": names[train_end:val_end], "test": names[val_end:]}
+
+
+def same_filesystem(path_a: str, path_b: str) -> bool:
+    return os.stat(path_a).st_dev == os.stat(path_b).st_dev
+
+
+def transfer_file(src: str, dst: str, mode: str) -> None:
+    """
+    Move, hardlink or copy `src` to `dst`. Moves and links are a rename or a
+    link when both are on one filesystem; otherwise (and for copies) the file
+    is copied to `dst` + PART_SUFFIX and renamed into place once complete, so
+    an interrupted copy never leaves a truncated `dst`. A move deletes `src`
+    only after that.
+    """
+    if mode in ('move', 'link'):
+        try:
+            (os.rename if mode == 'move' else os.link)(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    part = dst + PART_SUFFIX
+    shutil.copy2(src, part)
+    os.replace(part, dst)
+    if mode == 'move':
+        os.remove(src)
+
+
+def split_data(
+    train_ratio: float = 0.8,
+    val_ratio: Optional[float] = None,
+    test_ratio: float = 0.0,
+    seed: int = 0,
+    mode: str = 'move',
+    workers: int = 8,
+    resume: bool = True,
+    output_base: str = OUTPUT_BASE,
+    image_source: str = IMAGE_SOURCE,
+    label_source: str = LABEL_SOURCE,
+    xml_source: str = XML_LABEL_SOURCE,
+):
     """
-    Splits image and label data (both .txt and .xml) into training 
-    and validation sets.
+    Splits image and label data (both .txt and .xml) into training,
+    validation and (optionally) test sets.
 
-    This function assumes that for every image file, there is a 
-    corresponding .txt and .xml label file with the same base name.
+    Only samples with an image, a .txt and a .xml file of the same base
+    name are split. The shuffled assignment is written to
+    `<output_base>/split_plan.json` first; if a split is interrupted,
+    running it again continues from that plan (unless `resume=False`).
 
     Args:
-        train_ratio (float): The proportion of data for training. 
-                             Defaults to 0.8 (80%).
+        train_ratio (float): Proportion of data for training. Defaults to 0.8 (80%).
+        val_ratio (float): Proportion for validation. Defaults to the rest after train and test.
+        test_ratio (float): Proportion for testing. Defaults to 0 (no test set).
+        seed (int): Seed of the shuffle, so a split can be reproduced.
+        mode (str): 'move' the files, hardlink them ('link', keeping the
+            sources) or 'copy' them. Moves and links are plain renames/links
+            on the same filesystem; otherwise files are copied on a thread pool.
+        workers (int): Threads used when files have to be copied.
+        image_source, label_source, xml_source (str): Folders of the generated
+            images, .txt and .xml labels (SAVE_DIR, LABEL_DIR and XML_DIR by default).
     """
-    # === CONFIGURATION ===
-    # Define paths to your source folders
-    image_source = 'synthetic_images'
-    label_source = 'synthetic_labels'       # For .txt files
-    xml_label_source = 'synthetic_xml_labels' # <-- ADDED for .xml files
-    
-    # Define the base output directory
-    output_base = 'data'
-    
-    # Define label extensions
-    label_ext = '.txt'
-    xml_ext = '.xml' # <-- ADDED
-    # =====================
+    if val_ratio is None:
+        val_ratio = max(0.0, 1.0 - train_ratio - test_ratio)
+    ratios = (train_ratio, val_ratio, test_ratio)
+    sources = {'img': (image_source, None), 'label': (label_source, LABEL_EXT), 'xml_label': (xml_source, XML_EXT)}
 
     print("--- Starting Data Split (including XML) ---")
 
-    # 1. Setup paths for destination folders
-    train_img_path = os.path.join(output_base, 'img', 'train')
-    val_img_path = os.path.join(output_base, 'img', 'val')
-    train_label_path = os.path.join(output_base, 'label', 'train')
-    val_label_path = os.path.join(output_base, 'label', 'val')
-    train_xml_path = os.path.join(output_base, 'xml_label', 'train') # <-- ADDED
-    val_xml_path = os.path.join(output_base, 'xml_label', 'val')     # <-- ADDED
-
-    # 2. Create the required directory structure
+    # 1. Create the required directory structure
     print(f"Creating directory structure at: '{output_base}'")
-    for path in [train_img_path, val_img_path, train_label_path, val_label_path, train_xml_path, val_xml_path]:
-        os.makedirs(path, exist_ok=True)
+    for kind in sources:
+        for split in SPLITS:
+            os.makedirs(os.path.join(output_base, kind, split), exist_ok=True)
 
-    # 3. Get a list of all image files and shuffle them
-    try:
-        all_images = [f for f in os.listdir(image_source) if os.path.isfile(os.path.join(image_source, f))]
-        random.shuffle(all_images)
-        print(f"Found {len(all_images)} images to split.")
-    except FileNotFoundError:
-        print(f"ERROR: Source image directory not found at '{image_source}'. Please check the path.")
-        return
+    # 2. Load the plan of an interrupted split, or scan the sources and make a new one
+    plan_path = os.path.join(output_base, PLAN_FILENAME)
+    plan = None
+    if resume and os.path.exists(plan_path):
+        with open(plan_path, encoding='utf-8') as f:
+            plan = json.load(f)
+        if plan.get("complete"):
+            plan = None
+        else:
+            print(f"Resuming the split planned in '{plan_path}' (seed {plan['seed']}, mode '{plan['mode']}').")
+            mode = plan['mode']
+            # Continue from the folders the plan was made for
+            sources = {kind: (plan.get('sources', {}).get(kind, source), ext) for kind, (source, ext) in sources.items()}
+
+    if plan is None:
+        if not os.path.isdir(image_source):
+            print(f"ERROR: Source image directory not found at '{image_source}'. Check SAVE_DIR in .env or pass --images.")
+            return
+        samples, incomplete = scan_samples(image_source, label_source, xml_source)
+        print(f"Found {len(samples)} complete image/label/xml sets to split.")
+        if incomplete:
+            print(f"Warning: Skipping {len(incomplete)} incomplete samples (missing image, .txt or .xml), "
+                  f"e.g. {', '.join(incomplete[:5])}")
+        plan = {"seed": seed, "ratios": ratios, "mode": mode, "complete": False,
+                "sources": {kind: source for kind, (source, _) in sources.items()},
+                "splits": plan_split(samples, ratios, seed)}
+        with open(plan_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f)
+
+    # 3. Work out which files still have to be transferred (one scandir per directory).
+    # Renames/links are metadata-only when the source dir is on the output's filesystem; copies fan out over threads.
+    fast_pending = []  # (src, dst)
+    copy_pending = []
+    missing = 0
+    for kind, (source, ext) in sources.items():
+        source_names = {entry.name for entry in os.scandir(source)} if os.path.isdir(source) else set()
+        fast = mode in ('move', 'link') and bool(source_names) and same_filesystem(source, output_base)
+        for split, image_names in plan["splits"].items():
+            dest = os.path.join(output_base, kind, split)
+            dest_names = {entry.name for entry in os.scandir(dest)}
+            for image_name in image_names:
+                name = image_name if ext is None else os.path.splitext(image_name)[0] + ext
+                if name in dest_names:
+                    # Done before the interruption (copies only appear under their final name once complete);
+                    # a move may have stopped before deleting its source.
+                    if mode == 'move' and name in source_names:
+                        os.remove(os.path.join(source, name))
+                    continue
+                if name not in source_names:
+                    missing += 1
+                    continue
+                (fast_pending if fast else copy_pending).append((os.path.join(source, name), os.path.join(dest, name)))
+
+    # 4. Transfer them (a rename or link that crosses filesystems after all falls back to copying)
+    print(f"\nTransferring {len(fast_pending) + len(copy_pending)} files ({mode}: "
+          f"{len(fast_pending)} on the same filesystem, {len(copy_pending)} copied on {workers} threads)...")
+    for src, dst in fast_pending:
+        transfer_file(src, dst, mode)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(lambda paths: transfer_file(*paths, mode), copy_pending):
+            pass
+
+    plan["complete"] = True
+    with open(plan_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f)
 
-    # 4. Calculate the split point
-    split_index = int(len(all_images) * train_ratio)
-    train_files = all_images[:split_index]
-    val_files = all_images[split_index:]
-
-    # 5. Define a helper function to move files
-    def move_files(filenames, img_dest, label_dest, xml_dest): # <-- MODIFIED: added xml_dest
-        moved_count = 0
-        for img_name in filenames:
-            base_name, _ = os.path.splitext(img_name)
-            label_name = base_name + label_ext
-            xml_name = base_name + xml_ext # <-- ADDED
-
-            # Construct full source paths
-            src_img = os.path.join(image_source, img_name)
-            src_label = os.path.join(label_source, label_name)
-            src_xml = os.path.join(xml_label_source, xml_name) # <-- ADDED
-
-            # Check if all three corresponding files exist
-            if os.path.exists(src_img) and os.path.exists(src_label) and os.path.exists(src_xml):
-                shutil.move(src_img, os.path.join(img_dest, img_name))
-                shutil.move(src_label, os.path.join(label_dest, label_name))
-                shutil.move(src_xml, os.path.join(xml_dest, xml_name)) # <-- ADDED
-                moved_count += 1
-            else:
-                print(f"Warning: Skipping '{img_name}' as a corresponding label (.txt or .xml) was not found.")
-        return moved_count
-
-    # 6. Move the files to their new homes
-    print(f"\nMoving {len(train_files)} file sets to the training set...")
-    moved_train = move_files(train_files, train_img_path, train_label_path, train_xml_path) # <-- MODIFIED
-    
-    print(f"\nMoving {len(val_files)} file sets to the validation set...")
-    moved_val = move_files(val_files, val_img_path, val_label_path, val_xml_path) # <-- MODIFIED
-    
     print("\n--- Data Split Complete ---")
-    print(f"Training set: {moved_train} image/label/xml sets.")
-    print(f"Validation set: {moved_val} image/label/xml sets.")
+    for split in SPLITS:
+        if plan["splits"][split]:
+            print(f"{split.capitalize()} set: {len(plan['splits'][split])} image/label/xml sets.")
+    if missing:
+        print(f"Warning: {missing} planned files were found neither in the source nor in the destination.")
     print("---------------------------\n")
 
+
+def split_virtual(
+    train_ratio: float = 0.8,
+    val_ratio: Optional[float] = None,
+    test_ratio: float = 0.0,
+    seed: int = 0,
+    output_base: str = OUTPUT_BASE,
+    index_path: str = SAMPLE_INDEX_FILE,
+    image_source: str = IMAGE_SOURCE,
+    label_source: str = LABEL_SOURCE,
+    xml_source: str = XML_LABEL_SOURCE,
+):
+    """
+    Split without touching any sample: writes `train.txt`, `val.txt` and
+    `test.txt` (absolute image paths, one per line, as YOLO accepts for
+    `train:`/`val:`/`test:`) plus `index.jsonl`, the split of every sample
+    with its metadata (size, boxes, fonts) from the generator's sample index.
+    Re-splitting with another seed or ratios just rewrites these files.
+    For YOLO to find the labels, `image_source` and `label_source` must be
+    sibling folders named `images` and `labels`.
+    """
+    if val_ratio is None:
+        val_ratio = max(0.0, 1.0 - train_ratio - test_ratio)
+    ratios = (train_ratio, val_ratio, test_ratio)
+
+    print("--- Starting Virtual Data Split ---")
+    if not os.path.isdir(image_source):
+        print(f"ERROR: Source image directory not found at '{image_source}'. Check SAVE_DIR in .env or pass --images.")
+        return
+
+    samples, incomplete = scan_samples(image_source, label_source, xml_source)
+    print(f"Found {len(samples)} complete image/label/xml sets to split.")
+    if incomplete:
+        print(f"Warning: Skipping {len(incomplete)} incomplete samples (missing image, .txt or .xml), "
+              f"e.g. {', '.join(incomplete[:5])}")
+
+    # YOLO finds a label by replacing /images/ with /labels/ in the image path
+    image_dir = os.path.abspath(image_source)
+    if os.path.basename(image_dir) != 'images' or os.path.abspath(label_source) != os.path.join(os.path.dirname(image_dir), 'labels'):
+        print(f"Warning: YOLO won't find the labels of '{image_source}' in '{label_source}'; it expects sibling folders "
+              "'<dir>/images' and '<dir>/labels'. Generate with e.g. SAVE_DIR=\"dataset/images/\" and "
+              "LABEL_DIR=\"dataset/labels/\" in .env (data_split.py reads the same values).")
+
+    metadata = read_sample_index(index_path)
+    splits = plan_split(samples, ratios, seed)
+
+    os.makedirs(output_base, exist_ok=True)
+    without_metadata = 0
+    with open(os.path.join(output_base, 'index.jsonl'), 'w', encoding='utf-8') as index_file:
+        for split in SPLITS:
+            paths = [os.path.join(image_dir, name) for name in splits[split]]
+            with open(os.path.join(output_base, f'{split}.txt'), 'w', encoding='utf-8') as f:
+                f.write("".join(path + "\n" for path in paths))
+
+            for name, path in zip(splits[split], paths):
+                record = {"image": path, "split": split}
+                meta = metadata.get(name)
+                if meta is None:
+                    without_metadata += 1
+                else:
+                    record.update((key, meta[key]) for key in ("width", "height", "boxes", "fonts") if key in meta)
+                index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print("\n--- Virtual Data Split Complete ---")
+    for split in SPLITS:
+        if splits[split]:
+            print(f"{split.capitalize()} set: {len(splits[split])} images listed in {os.path.join(output_base, split + '.txt')}")
+    if without_metadata:
+        print(f"Warning: {without_metadata} samples have no entry in '{index_path}'; their metadata is left out.")
+    print("---------------------------\n")
+
+
 # This part allows you to run the script directly from the command line
 if __name__ == '__main__':
-    split_data(train_ratio=0.8)
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Split the generated images and labels into train/val/test folders under data/.",
+        epilog="Example: python3 data_split.py --train 0.8 --val 0.1 --test 0.1 --seed 42 --mode link"
+    )
+    parser.add_argument("--train", type=float, default=0.8, help="Training proportion (default: 0.8).")
+    parser.add_argument("--val", type=float, default=None, help="Validation proportion (default: the rest).")
+    parser.add_argument("--test", type=float, default=0.0, help="Test proportion (default: 0).")
+    parser.add_argument("--seed", type=int, default=0, help="Shuffle seed (default: 0).")
+    parser.add_argument("--mode", choices=("move", "link", "copy"), default="move",
+                        help="Move files (default), hardlink them, or copy them.")
+    parser.add_argument("--workers", type=int, default=8, help="Copy threads across filesystems (default: 8).")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore the plan of an interrupted split.")
+    parser.add_argument("--virtual", action="store_true",
+                        help="Don't touch any file; write train.txt/val.txt/test.txt and index.jsonl instead.")
+    parser.add_argument("--images", default=IMAGE_SOURCE, help=f"Folder of the generated images (default: SAVE_DIR, {IMAGE_SOURCE}).")
+    parser.add_argument("--labels", default=LABEL_SOURCE, help=f"Folder of the .txt labels (default: LABEL_DIR, {LABEL_SOURCE}).")
+    parser.add_argument("--xml", default=XML_LABEL_SOURCE, help=f"Folder of the .xml labels (default: XML_DIR, {XML_LABEL_SOURCE}).")
+    parser.add_argument("--index", default=SAMPLE_INDEX_FILE,
+                        help=f"Sample index written by the generator, for --virtual (default: {SAMPLE_INDEX_FILE}).")
+    args = parser.parse_args()
+
+    if args.virtual:
+        split_virtual(train_ratio=args.train, val_ratio=args.val, test_ratio=args.test, seed=args.seed,
+                      index_path=args.index, image_source=args.images, label_source=args.labels, xml_source=args.xml)
+    else:
+        split_data(train_ratio=args.train, val_ratio=args.val, test_ratio=args.test, seed=args.seed,
+                   mode=args.mode, workers=args.workers, resume=not args.no_resume,
+                   image_source=args.images, label_source=args.labels, xml_source=args.xml)
@@ -1,98 +1,359 @@
 #!/usr/bin/env python3
 
 import os
-import math
+import sys
+import time
+import queue
+import random
 import argparse
-import subprocess
+import multiprocessing as mp
+
+import dotenv
+import numpy as np
+
+from helper.background_pool import open_background_pool
+from helper.sample_index import open_sample_index
+from helper.output_sinks import describe_output, stored_image_sizes
+from helper.progress_manifest import read_manifest, missing_indices, sample_key
+from helper import profiling
 
 # === CONFIGURATION ===
-# The name for our tmux session.
-SESSION_NAME = "data_generator"
-# The path to your virtual environment's activate script.
-# os.path.expanduser handles the '~' correctly.
-VENV_PATH = os.path.expanduser("~/py_env/normal/bin/activate")
-# The number of images each Python process will generate.
+# The number of images each task pulled from the queue covers.
 CHUNK_SIZE = 10
-# Your Python script's name.
-PYTHON_SCRIPT = "main.py"
+# How often (in finished images) the parent prints a progress line.
+PROGRESS_EVERY = 100
+
+
+def worker(task_queue: mp.Queue, progress_queue: mp.Queue) -> None:
+    """
+    Long-lived worker: imports the generator (config, fonts and text file)
+    once, then renders every index range it pulls from `task_queue`.
+    """
+    # Forked workers inherit the parent's RNG state; reseed so they diverge.
+    # (With SEED set, every sample uses its own stream instead, see helper/rng.py.)
+    random.seed()
+    np.random.seed()
+
+    import main  # loads .env and TEXT_FILE once per worker
+
+    # Rendered samples whose write is not confirmed yet: key -> (index, stats).
+    # An image is reported "done" only once the sink has stored it.
+    pending: dict[str, tuple[int, dict]] = {}
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        start_index, end_index = task
+        for i in range(start_index, end_index):
+            try:
+                stats = {}
+                with profiling.stage("sample"):
+                    main.generate_sample(i, stats)
+            except Exception as e:
+                progress_queue.put(("error", i, f"{type(e).__name__}: {e}"))
+                continue
+            pending[sample_key(i)] = (i, stats)
+            report_writes(main, pending, progress_queue)
+
+    # Workers exit without running atexit handlers, so close outputs explicitly.
+    # This waits for the sink's writer threads, then reports the samples they stored or failed to store.
+    try:
+        main.close_outputs()
+    except Exception as e:
+        progress_queue.put(("write_error", os.getpid(), f"{type(e).__name__}: {e}"))
+    report_writes(main, pending, progress_queue)
+    for i, _ in pending.values():
+        progress_queue.put(("error", i, "the output sink never confirmed the write"))
+    progress_queue.put(("exit", os.getpid(), {"encoder": main.IMAGE_ENCODER.stats(), "profile": profiling.snapshot()}))
+
+
+def report_writes(main, pending: dict[str, tuple[int, dict]], progress_queue: mp.Queue) -> None:
+    """Report the pending samples the sink has stored ("done") or failed to store ("error") since the last call"""
+    written, failed = main.collect_writes()
+    for key in written:
+        i, stats = pending.pop(key)
+        progress_queue.put(("done", i, stats))
+    for key, error in failed:
+        i, _ = pending.pop(key)
+        progress_queue.put(("error", i, f"write failed: {type(error).__name__}: {error}"))
+
+
+def prepare_background_pool() -> None:
+    """
+    Build the shared background pool once in the parent, so workers only
+    have to memory-map it instead of racing to decode the backgrounds.
+    """
+    dotenv.load_dotenv()
+    pool_dir = os.getenv("BACKGROUND_POOL_DIR", "")
+    bg_dir = os.getenv("BACKGROUND_IMAGES_DIR", "background/")
+    if not pool_dir or not bg_dir:
+        return
+
+    image_size = tuple(map(int, os.getenv("IMAGE_SIZE", "775,550").split(',')))[:2]
+    scale_buckets = tuple(map(float, filter(None, os.getenv("BACKGROUND_SCALE_BUCKETS", "").split(','))))
+    print(f"Preparing background pool in '{pool_dir}'...")
+    open_background_pool(bg_dir, pool_dir, image_size, scale_buckets)
+
+
+def completed_keys(source: str) -> set[str]:
+    """
+    Keys of the samples a previous run already wrote, from a listing of the
+    output sink (`source="sink"`), or from the progress manifest ("manifest")
+    checked against that listing: a sample only counts if the output still
+    holds an image of the size the manifest recorded. Exits if the manifest
+    was written for another output.
+    """
+    dotenv.load_dotenv()
+    output_config = (
+        os.getenv("OUTPUT_FORMAT", "files"),
+        os.getenv("SAVE_DIR", "synthetic_images/"),
+        os.getenv("LABEL_DIR", "synthetic_labels/"),
+        os.getenv("XML_DIR", "synthetic_xml_labels/"),
+        os.getenv("SHARD_DIR", "synthetic_shards/"),
+        os.getenv("KV_PATH", "synthetic_samples.db"),
+    )
+    sizes = stored_image_sizes(*output_config)
+    if source == "sink":
+        return set(sizes)
+
+    manifest_path = os.getenv("PROGRESS_MANIFEST", "synthetic_manifest.jsonl")
+    if not manifest_path:
+        print("Warning: PROGRESS_MANIFEST is not set; resuming from a listing of the output instead.", file=sys.stderr)
+        return set(sizes)
+    try:
+        manifest_output, records = read_manifest(manifest_path)
+    except OSError as e:
+        print(f"Warning: can't read the progress manifest ({e}); resuming from a listing of the output instead.", file=sys.stderr)
+        return set(sizes)
+
+    output = describe_output(*output_config)
+    if manifest_output is None:
+        if records:
+            print(f"Warning: '{manifest_path}' doesn't record which output it describes; "
+                  "only its samples that are in the configured output count.", file=sys.stderr)
+    elif manifest_output != output:
+        raise SystemExit(f"'{manifest_path}' was written for the output {manifest_output}, not the configured "
+                         f"output {output}. Use --resume-from sink, or point PROGRESS_MANIFEST at this output's manifest.")
+
+    completed = {key for key, record in records.items() if sizes.get(key) == record["size"]}
+    if len(completed) < len(records):
+        print(f"Warning: {len(records) - len(completed)} images in the manifest are missing from the output "
+              "or have another size; they are rendered again.", file=sys.stderr)
+    return completed
+
+
+def make_tasks(indices: list[int], chunk_size: int) -> list[tuple[int, int]]:
+    """Cut sorted `indices` into (start, end) ranges of consecutive indices, at most `chunk_size` long"""
+    tasks = []
+    for i in indices:
+        if tasks and tasks[-1][1] == i and i - tasks[-1][0] < chunk_size:
+            tasks[-1] = (tasks[-1][0], i + 1)
+        else:
+            tasks.append((i, i + 1))
+    return tasks
+
+
+def run(indices: list[int], num_workers: int, chunk_size: int = CHUNK_SIZE, index_path: str = "", profile_json: str = "") -> int:
+    """
+    Generate the images with the given (sorted) indices with `num_workers` processes.
+    The metadata of every finished image is appended to the sample index
+    at `index_path` (if set). With stage profiling enabled, the workers'
+    stage timings are merged, printed and saved to `profile_json` (if set).
+    Returns the number of images that failed.
+    """
+    ctx = mp.get_context()
+    task_queue = ctx.Queue()
+    progress_queue = ctx.Queue()
+
+    for task in make_tasks(indices, chunk_size):
+        task_queue.put(task)
+    for _ in range(num_workers):
+        task_queue.put(None)
+
+    workers = [ctx.Process(target=worker, args=(task_queue, progress_queue), daemon=True)
+               for _ in range(num_workers)]
+    for p in workers:
+        p.start()
+
+    total = len(indices)
+    done = 0
+    failed = 0
+    exited = 0
+    words = {"words_sampled": 0, "words_drawn": 0, "words_discarded": 0}
+    max_discarded = 0  # the layout stops at the first word that doesn't fit, so this should stay at most 1
+    encoded = {"images": 0, "reused": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0}
+    profiles = []
+    started_at = time.perf_counter()
+    sample_index = open_sample_index(index_path)
+
+    while exited < num_workers:
+        try:
+            kind, value, message = progress_queue.get(timeout=5)
+        except queue.Empty:
+            # A worker killed by the OS never sends "exit"; stop waiting for it.
+            if not any(p.is_alive() for p in workers):
+                break
+            continue
+
+        if kind == "exit":
+            exited += 1
+            for key in encoded:
+                if key == "max_seconds":
+                    encoded[key] = max(encoded[key], message["encoder"][key])
+                else:
+                    encoded[key] += message["encoder"][key]
+            profiles.append(message["profile"])
+            continue
+        if kind == "write_error":
+            # Closing the sink failed (e.g. finishing its last shard); the images it reported stored stay counted.
+            failed += 1
+            print(f"Failed to write output in worker {value}: {message}", file=sys.stderr)
+            continue
+
+        done += 1
+        if kind == "error":
+            failed += 1
+            print(f"Failed img_{value:05d}: {message}", file=sys.stderr)
+        else:
+            for key in words:
+                words[key] += message.get(key, 0)
+            max_discarded = max(max_discarded, message.get("words_discarded", 0))
+            if sample_index is not None:
+                sample_index.append(value, message)
+
+        if done % PROGRESS_EVERY == 0 or done == total:
+            elapsed = time.perf_counter() - started_at
+            rate = done / elapsed if elapsed > 0 else 0.0
+            pages = max(done - failed, 1)
+            print(f"[{done}/{total}] {rate:.2f} img/s, {failed} failed, "
+                  f"words/page: {words['words_drawn'] / pages:.1f} drawn, "
+                  f"{words['words_discarded'] / pages:.1f} of {words['words_sampled'] / pages:.1f} sampled discarded "
+                  f"(at most {max_discarded} on a page)")
+
+    for p in workers:
+        p.join()
+    if sample_index is not None:
+        sample_index.close()
+
+    if encoded["images"]:
+        print(f"Encoding: {encoded['seconds'] / encoded['images'] * 1000:.1f} ms/img on average, "
+              f"{encoded['max_seconds'] * 1000:.1f} ms max, {encoded['bytes'] / encoded['images'] / 1024:.0f} KB/img, "
+              f"{encoded['reused']} reused JPEGs")
+
+    if profiling.is_enabled():
+        profile = profiling.merge(profiles)
+        print(f"Stage timings over {len(profiles)} workers (inclusive; writer threads overlap with rendering):")
+        print(profiling.format_table(profile))
+        if profile_json:
+            profiling.save_json(profile, profile_json)
+            print(f"Saved stage timings to {profile_json}")
+
+    if done < total:
+        print(f"Warning: only {done} of {total} images were reported back.", file=sys.stderr)
+    return failed + (total - done)
 
 
 def main():
     """
-    Main function to set up and run parallel processes in a tmux session.
+    Main function to split the job into index ranges and render them on a local process pool.
     """
-    # 1. Setup argument parser to get user input
     parser = argparse.ArgumentParser(
-        description="Run multiple Python data generation scripts in parallel using tmux.",
-        epilog="Example: python3 generate.py 50000"
+        description="Generate synthetic images in parallel on a pool of long-lived worker processes.",
+        epilog="Example: python3 generator.py 50000 --workers 8"
     )
     parser.add_argument(
         "total_images",
         type=int,
         help="The total number of images to generate."
     )
+    parser.add_argument(
+        "--start",
+        type=int,
+        default=0,
+        help="Index of the first image (default: 0)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: number of CPU cores)."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Base seed (overrides SEED in .env). Sample i is then reproducible on its own: "
+             "python3 main.py i i+1 1 with the same SEED renders it again."
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help=f"Number of images per task pulled from the queue (default: {CHUNK_SIZE})."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Only render the images of the range that a previous run did not write."
+    )
+    parser.add_argument(
+        "--resume-from",
+        choices=("manifest", "sink"),
+        default="manifest",
+        help="Where --resume looks for written images: the PROGRESS_MANIFEST (default) "
+             "or a listing of the output itself (for runs without a manifest)."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time every stage of the generation loop in the workers and print a report (same as PROFILE_STAGES=true)."
+    )
+    parser.add_argument(
+        "--profile-json",
+        default="",
+        help="Also save the stage timings as JSON to this path (implies --profile)."
+    )
     args = parser.parse_args()
-    total_images = args.total_images
-
-    # 2. Kill any old tmux session with the same name to start fresh
-    # The 'capture_output=True' prevents the command's stdout/stderr from being printed.
-    check_session_cmd = ["tmux", "has-session", "-t", SESSION_NAME]
-    session_exists = subprocess.run(check_session_cmd, capture_output=True).returncode == 0
-
-    if session_exists:
-        print(f"An old session named '{SESSION_NAME}' was found. Killing it.")
-        subprocess.run(["tmux", "kill-session", "-t", SESSION_NAME], check=True)
-
-    # 3. Calculate the number of chunks needed
-    # Using math.ceil ensures we have enough chunks for all images.
-    num_chunks = math.ceil(total_images / CHUNK_SIZE)
-    
-    print(f"Total images to generate: {total_images}")
-    print(f"Chunk size: {CHUNK_SIZE}")
-    print(f"This will require {num_chunks} parallel processes.")
+
+    start = args.start
+    end = args.start + args.total_images
+    if args.seed is not None:
+        os.environ["SEED"] = str(args.seed)  # read by main.py in every worker
+    dotenv.load_dotenv()
+    seed_str = os.getenv("SEED", "")
+    # Check here, so a bad seed stops the run instead of failing every sample in every worker
+    if seed_str and (not seed_str.lstrip("-").isdigit() or int(seed_str) < 0):
+        parser.error(f"the seed must be a non-negative integer, got {seed_str!r} (--seed or SEED)")
+    if args.profile or args.profile_json:
+        os.environ["PROFILE_STAGES"] = "true"  # read by helper/profiling.py in every worker
+        profiling.enable()
+
+    indices = list(range(start, end))
+    if args.resume:
+        indices = missing_indices(indices, completed_keys(args.resume_from))
+        print(f"Resuming: {args.total_images - len(indices)} of {args.total_images} images already written "
+              f"(from the {args.resume_from}).")
+        if not indices:
+            print("Nothing left to generate.")
+            return
+
+    num_workers = max(1, min(args.workers, len(indices)))
+
+    print(f"Total images to generate: {len(indices)}")
+    print(f"Chunk size: {args.chunk_size}")
+    print(f"Workers: {num_workers}")
     print("--------------------------------------------------")
 
-    # 4. Loop to create the tmux windows and start the processes
-    for i in range(num_chunks):
-        start_index = i * CHUNK_SIZE
-        # Use min() to cap the end index for the very last chunk
-        end_index = min((i + 1) * CHUNK_SIZE, total_images)
-
-        window_name = f"chunk_{i + 1}"
-        
-        # This command will be run inside the shell started by tmux
-        command_to_run = (
-            f". {VENV_PATH}; "
-            f"python3 {PYTHON_SCRIPT} {start_index} {end_index} 1"
-        )
-        
-        print(f"Starting process {i + 1}: {command_to_run}")
-
-        if i == 0:
-            # Create the first window and the session itself
-            tmux_cmd = [
-                "tmux", "new-session", "-d",
-                "-s", SESSION_NAME,
-                "-n", window_name,
-                command_to_run
-            ]
-        else:
-            # Create subsequent windows in the existing session
-            tmux_cmd = [
-                "tmux", "new-window",
-                "-t", SESSION_NAME,
-                "-n", window_name,
-                command_to_run
-            ]
-        
-        # Run the appropriate tmux command
-        subprocess.run(tmux_cmd, check=True)
+    prepare_background_pool()
+    index_path = os.getenv("SAMPLE_INDEX_FILE", "synthetic_index.jsonl")
+    failed = run(indices, num_workers, args.chunk_size, index_path, args.profile_json)
 
     print("--------------------------------------------------")
-    print(f"All generation processes have been started in the tmux session '{SESSION_NAME}'.")
-    print("You can attach to it with: tmux attach-session -t data_generator")
-    print("You can now safely disconnect from the server.")
+    print(f"Finished: {len(indices) - failed} generated, {failed} failed.")
+    sys.exit(1 if failed else 0)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
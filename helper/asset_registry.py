@@ -0,0 +1,72 @@
+from typing import NamedTuple, Optional
+import os
+import random
+
+
+class AssetEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    format: str
+
+
+class AssetRegistry:
+    """
+    Immutable index of the files in an asset directory.
+
+    The directory is scanned once on creation; call `rescan` to pick up
+    files that were added or removed afterwards.
+    """
+
+    def __init__(self, directory: str, extensions: Optional[tuple[str, ...]] = None):
+        self.directory = directory
+        self.extensions = extensions
+        self.entries: tuple[AssetEntry, ...] = ()
+        self.rescan()
+
+    def rescan(self) -> None:
+        """Rebuild the index from the directory contents"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if self.extensions is not None and not entry.name.endswith(self.extensions):
+                    continue
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                fmt = os.path.splitext(entry.name)[1].lstrip('.').lower()
+                entries.append(AssetEntry(os.path.join(self.directory, entry.name), stat.st_size, stat.st_mtime, fmt))
+        # Sorted so that the same seed picks the same asset on every machine.
+        self.entries = tuple(sorted(entries))
+
+    @property
+    def paths(self) -> tuple[str, ...]:
+        return tuple(e.path for e in self.entries)
+
+    def choice(self, rng=random) -> AssetEntry:
+        """Pick a random entry in O(1) (with `rng`, see helper/rng.py)"""
+        return rng.choice(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+_REGISTRIES: dict[tuple[str, Optional[tuple[str, ...]]], AssetRegistry] = {}
+
+
+def get_registry(directory: str, extensions: Optional[tuple[str, ...]] = None) -> AssetRegistry:
+    """Get the registry for `directory`, scanning it on first use"""
+    key = (directory, extensions)
+    registry = _REGISTRIES.get(key)
+    if registry is None:
+        registry = _REGISTRIES[key] = AssetRegistry(directory, extensions)
+    return registry
+
+
+def rescan_all() -> None:
+    """Rescan every registry created so far"""
+    for registry in _REGISTRIES.values():
+        registry.rescan()
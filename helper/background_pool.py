@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import random
+from typing import Optional
+
+import numpy as np
+import dotenv
+from PIL import Image
+
+from helper.asset_registry import get_registry
+
+# The pixels and the index (JSON) live in one file, so replacing it publishes both at once:
+# the pixels, the index, the index length (8 bytes, little-endian), then MAGIC.
+POOL_FILE = "pool.bin"
+MAGIC = b"BGPOOL1\n"
+
+
+def _variant_sizes(based_image_size: tuple[int, int], scale_buckets: tuple[float, ...]) -> list[tuple[int, int]]:
+    return [(int(based_image_size[0] * s), int(based_image_size[1] * s)) for s in scale_buckets]
+
+
+def build_background_pool(bg_dir: str, pool_dir: str, based_image_size: tuple[int, int],
+                          scale_buckets: tuple[float, ...] = ()) -> None:
+    """
+    Decode every background in `bg_dir` once and write the RGB pixels,
+    plus one pre-resized variant per scale bucket, into a single file
+    (followed by its index) that can be memory-mapped by every worker.
+    """
+    os.makedirs(pool_dir, exist_ok=True)
+    registry = get_registry(bg_dir)
+    registry.rescan()
+
+    entries = []
+    offset = 0
+    tmp_pool = os.path.join(pool_dir, f"{POOL_FILE}.{os.getpid()}.tmp")
+    with open(tmp_pool, "wb") as f:
+        for asset in registry:
+            img = Image.open(asset.path).convert('RGB')
+            variants = []
+            for size in [img.size] + _variant_sizes(based_image_size, scale_buckets):
+                resized = img if size == img.size else img.resize(size)
+                data = resized.tobytes()
+                f.write(data)
+                variants.append({"size": list(size), "offset": offset})
+                offset += len(data)
+            entries.append({"source": asset.path, "mtime": asset.mtime, "variants": variants})
+
+        index = json.dumps({
+            "based_image_size": list(based_image_size),
+            "scale_buckets": list(scale_buckets),
+            "entries": entries,
+        }).encode("utf-8")
+        f.write(index + len(index).to_bytes(8, "little") + MAGIC)
+
+    # A single rename, so readers see either the old pool or the new one, never a mix of both.
+    os.replace(tmp_pool, os.path.join(pool_dir, POOL_FILE))
+
+
+class BackgroundPool:
+    """
+    Read-only view over a pool written by `build_background_pool`.
+
+    Pixels are memory-mapped, so all processes opening the same pool share
+    one copy in the page cache and picking a background is just a slice.
+    """
+
+    def __init__(self, pool_dir: str):
+        self.pool_dir = pool_dir
+        # Index and pixels come from one open file, so a concurrent rebuild can't pair two pools.
+        with open(os.path.join(pool_dir, POOL_FILE), "rb") as f:
+            size = f.seek(-len(MAGIC) - 8, os.SEEK_END)
+            index_len = int.from_bytes(f.read(8), "little")
+            if f.read() != MAGIC:
+                raise ValueError(f"'{f.name}' is not a background pool")
+            pixels_len = f.seek(size - index_len)
+            self.index = json.loads(f.read(index_len))
+            if pixels_len > 0:
+                self._pixels = np.memmap(f, dtype=np.uint8, mode="r", shape=(pixels_len,))
+            else:
+                self._pixels = np.zeros(0, dtype=np.uint8)
+        self.entries = self.index["entries"]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def is_stale(self, bg_dir: str, based_image_size: tuple[int, int], scale_buckets: tuple[float, ...]) -> bool:
+        """Check whether the pool no longer matches the backgrounds on disk or the configured buckets"""
+        if tuple(self.index["based_image_size"]) != tuple(based_image_size):
+            return True
+        if tuple(self.index["scale_buckets"]) != tuple(scale_buckets):
+            return True
+        registry = get_registry(bg_dir)
+        pooled = [(e["source"], e["mtime"]) for e in self.entries]
+        return pooled != [(a.path, a.mtime) for a in registry]
+
+    def get_array(self, entry_index: int, variant: int = 0) -> np.ndarray:
+        """Return the (H, W, 3) pixels of one variant without copying"""
+        v = self.entries[entry_index]["variants"][variant]
+        w, h = v["size"]
+        start = v["offset"]
+        return self._pixels[start:start + w * h * 3].reshape(h, w, 3)
+
+    def _pick_variant(self, entry_index: int, target_size: tuple[int, int]) -> int:
+        # Smallest variant that still covers the target, so we only ever downscale from it.
+        best = 0
+        best_area = None
+        for i, v in enumerate(self.entries[entry_index]["variants"]):
+            w, h = v["size"]
+            if w >= target_size[0] and h >= target_size[1] and (best_area is None or w * h < best_area):
+                best, best_area = i, w * h
+        return best
+
+    def get_image(self, target_size: tuple[int, int], entry_index: Optional[int] = None, rng=random) -> Image.Image:
+        """Return a new RGB image of `target_size` made from a random (drawn from `rng`) or given background"""
+        if entry_index is None:
+            entry_index = rng.randrange(len(self.entries))
+        arr = self.get_array(entry_index, self._pick_variant(entry_index, target_size))
+        # `resize` always returns a new image, so the shared pixels are never drawn on.
+        return Image.fromarray(arr).resize(target_size)
+
+
+def load_background_pool(bg_dir: str, pool_dir: str, based_image_size: tuple[int, int],
+                         scale_buckets: tuple[float, ...] = ()) -> Optional[BackgroundPool]:
+    """Open the pool in `pool_dir` without building it; None if it is missing or stale"""
+    if not os.path.exists(os.path.join(pool_dir, POOL_FILE)):
+        return None
+    pool = BackgroundPool(pool_dir)
+    return None if pool.is_stale(bg_dir, based_image_size, scale_buckets) else pool
+
+
+def open_background_pool(bg_dir: str, pool_dir: str, based_image_size: tuple[int, int],
+                         scale_buckets: tuple[float, ...] = ()) -> BackgroundPool:
+    """Open the pool in `pool_dir`, (re)building it first if it is missing or stale"""
+    if os.path.exists(os.path.join(pool_dir, POOL_FILE)):
+        pool = BackgroundPool(pool_dir)
+        if not pool.is_stale(bg_dir, based_image_size, scale_buckets):
+            return pool
+    build_background_pool(bg_dir, pool_dir, based_image_size, scale_buckets)
+    return BackgroundPool(pool_dir)
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    parser = argparse.ArgumentParser(description="Build (or refresh) the shared background pool.")
+    parser.add_argument("--bg-dir", default=os.getenv("BACKGROUND_IMAGES_DIR", "background/"), help="Folder with the background images (default: BACKGROUND_IMAGES_DIR).")
+    parser.add_argument("--pool-dir", default=os.getenv("BACKGROUND_POOL_DIR") or ".cache/background_pool/", help="Where to write the pool (default: BACKGROUND_POOL_DIR).")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the pool is up to date.")
+    args = parser.parse_args()
+
+    image_size = tuple(map(int, os.getenv("IMAGE_SIZE", "775,550").split(',')))[:2]
+    scale_buckets = tuple(map(float, filter(None, os.getenv("BACKGROUND_SCALE_BUCKETS", "").split(','))))
+    if args.force:
+        build_background_pool(args.bg_dir, args.pool_dir, image_size, scale_buckets)
+        pool = BackgroundPool(args.pool_dir)
+    else:
+        pool = open_background_pool(args.bg_dir, args.pool_dir, image_size, scale_buckets)
+    print(f"Background pool in '{args.pool_dir}': {len(pool)} backgrounds")
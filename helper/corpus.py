@@ -0,0 +1,119 @@
+"""
+Compact, memory-mappable word corpus.
+
+Layout (little endian):
+    magic       8 bytes   b"KHCORPUS"
+    version     uint32
+    flags       uint32    bit 0 set when the words are already khnormal-ised
+    count       uint64
+    offsets     uint64 * (count + 1)   byte offsets of each word in the blob
+    blob        UTF-8 bytes of all words, back to back
+"""
+import mmap
+import struct
+from typing import Iterator
+
+from helper.khnormal import khnormal, khtest
+
+MAGIC = b"KHCORPUS"
+VERSION = 1
+FLAG_NORMALIZED = 1
+_HEADER = struct.Struct("<8sIIQ")
+
+
+def is_corpus_file(file_path: str) -> bool:
+    """Check whether `file_path` is a corpus written by `build_corpus`"""
+    with open(file_path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def build_corpus(text_file: str, out_path: str, normalize: bool = True, validate: bool = True) -> dict:
+    """
+    Read one word per line from `text_file`, normalise each word with
+    `khnormal`, drop the ones `khtest` rejects and write the result to
+    `out_path`. Returns counts of kept, empty and invalid lines.
+    """
+    with open(text_file, "r", encoding='utf-8') as f:
+        lines = f.read().splitlines()
+
+    words = []
+    empty = invalid = 0
+    for line in lines:
+        if not line:
+            empty += 1
+            continue
+        word = "".join(khnormal(line)) if normalize else line
+        if validate and khtest(word) is not None:
+            invalid += 1
+            continue
+        words.append(word.encode("utf-8"))
+
+    offsets = [0]
+    for w in words:
+        offsets.append(offsets[-1] + len(w))
+
+    with open(out_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, FLAG_NORMALIZED if normalize else 0, len(words)))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(b"".join(words))
+
+    return {"words": len(words), "empty": empty, "invalid": invalid}
+
+
+class Corpus:
+    """
+    Read-only sequence of words backed by a memory-mapped corpus file.
+
+    Supports `len()` and integer indexing, so it can be passed straight to
+    `random.choice` / `random.choices`. All processes mapping the same file
+    share its pages, and words are only decoded when they are picked.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{file_path} is not a corpus file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported corpus version {version} in {file_path}")
+
+        self.normalized = bool(flags & FLAG_NORMALIZED)
+        self._count = count
+        offsets_start = _HEADER.size
+        self._blob_start = offsets_start + 8 * (count + 1)
+        self._offsets = memoryview(self._mm)[offsets_start:self._blob_start].cast("Q")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("corpus index out of range")
+        start = self._blob_start + self._offsets[i]
+        end = self._blob_start + self._offsets[i + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self[i]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a pre-normalised, memory-mappable corpus from a text file")
+    parser.add_argument("text_file", help="Input text file with one word per line")
+    parser.add_argument("-o", "--output", required=True, help="Output corpus file")
+    parser.add_argument("--no-normalize", action="store_true", help="Store words as they are")
+    parser.add_argument("--keep-invalid", action="store_true", help="Keep words that fail khtest")
+    args = parser.parse_args()
+
+    stats = build_corpus(args.text_file, args.output,
+                         normalize=not args.no_normalize, validate=not args.keep_invalid)
+    print(f"Wrote {stats['words']} words to {args.output} "
+          f"(skipped {stats['empty']} empty and {stats['invalid']} invalid lines)")
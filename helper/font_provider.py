@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from PIL import ImageFont
+from PIL.ImageFont import FreeTypeFont
+import dotenv
+import os
+
+
+dotenv.load_dotenv()
+
+FONT_CACHE_MAX_ENTRIES = int(os.getenv("FONT_CACHE_MAX_ENTRIES", default=1024))
+FONT_CACHE_MAX_BYTES = int(os.getenv("FONT_CACHE_MAX_BYTES", default=512 * 1024 * 1024))
+
+
+class FontCache:
+    """
+    LRU cache of loaded `FreeTypeFont` objects keyed by (path, size).
+
+    The size of a cached font is estimated from its file size, since
+    FreeType keeps the face data roughly that large in memory.
+    A miss costs about 1 ms (parsing plus the first shaping), so the cache
+    only matters once pages reuse (path, size) pairs; with every font at
+    every size that takes fonts x sizes entries.
+    """
+
+    def __init__(self, max_entries: int = FONT_CACHE_MAX_ENTRIES, max_bytes: int = FONT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._fonts: OrderedDict[tuple[str, int], tuple[FreeTypeFont, int]] = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, font_path: str, font_size: int) -> FreeTypeFont:
+        """Return the font at `font_path` loaded at `font_size`, parsing it only on a miss."""
+        key = (font_path, font_size)
+        entry = self._fonts.get(key)
+        if entry is not None:
+            self._fonts.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        font = ImageFont.truetype(font_path, font_size)
+        nbytes = os.path.getsize(font_path)
+        self._fonts[key] = (font, nbytes)
+        self.current_bytes += nbytes
+        self._evict()
+        return font
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds `max_bytes`.
+        while len(self._fonts) > 1 and (len(self._fonts) > self.max_entries or self.current_bytes > self.max_bytes):
+            _, (_, nbytes) = self._fonts.popitem(last=False)
+            self.current_bytes -= nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._fonts.clear()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._fonts),
+            "bytes": self.current_bytes,
+        }
+
+    def __len__(self) -> int:
+        return len(self._fonts)
+
+
+# Process-wide cache shared by every caller of `get_font`.
+FONT_CACHE = FontCache()
+
+
+def get_font(font_path: str, font_size: int) -> FreeTypeFont:
+    """Get a font from the process-wide font cache"""
+    return FONT_CACHE.get(font_path, font_size)
@@ -1,10 +1,11 @@
 import numpy as np
 from PIL import Image
-import math
+import cv2
 import dotenv
 import os
 import json
 import random
+import weakref
 
 
 dotenv.load_dotenv()
@@ -13,6 +14,50 @@ colors_raw = os.getenv("CANDIDATE_COLORS", default="{}")
 CANDIDATE_COLORS = json.loads(colors_raw)
 MIN_DISTANCE = int(os.getenv("MIN_DISTANCE", default=100))
 
+# Candidates preloaded once as an (N, 3) array for vectorized distances
+_CANDIDATE_RGB = [tuple(rgb) for rgb in CANDIDATE_COLORS.values()]
+_CANDIDATE_ARRAY = np.array(_CANDIDATE_RGB, dtype=np.float64).reshape(-1, 3)
+
+
+class BackgroundStats:
+    """Summed-area table of an RGB image, giving the mean color of any rectangle in O(1)"""
+
+    def __init__(self, img: Image.Image):
+        img_array = np.asarray(img.convert("RGB"))
+        self.width = img.width
+        self.height = img.height
+        # (H + 1, W + 1, 3); float64 holds the sums exactly for any realistic image size
+        self.sat = cv2.integral(img_array, sdepth=cv2.CV_64F)
+
+    def region_sum(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        sat = self.sat
+        return sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0]
+
+    def region_mean(self, x0: int, y0: int, x1: int, y1: int) -> tuple[int, int, int]:
+        """Average color of the pixels in [x0, x1) x [y0, y1)"""
+        avg_color = self.region_sum(x0, y0, x1, y1) / ((x1 - x0) * (y1 - y0))
+        return tuple(avg_color.astype(int))
+
+
+# Stats per background image, dropped when the image is garbage collected.
+_STATS_CACHE: dict[int, tuple[weakref.ref, BackgroundStats]] = {}
+
+
+def get_background_stats(image: Image.Image) -> BackgroundStats:
+    """
+    Get the (cached) summed-area table of `image`. It is computed on the
+    first call, so later queries ignore anything drawn on the image since.
+    """
+    key = id(image)
+    cached = _STATS_CACHE.get(key)
+    if cached is not None and cached[0]() is image:
+        return cached[1]
+
+    stats = BackgroundStats(image)
+    _STATS_CACHE[key] = (weakref.ref(image, lambda _, key=key: _STATS_CACHE.pop(key, None)), stats)
+    return stats
+
+
 def calculate_average_bg_color(img: Image.Image) -> tuple[int, int, int]:
     """Calculate the average color of the image"""
     img = img.convert("RGB")
@@ -24,31 +69,33 @@ def calculate_average_bg_color(img: Image.Image) -> tuple[int, int, int]:
 def contrast_color(
     bg_color: tuple[int, int, int],
     candidates: dict = CANDIDATE_COLORS,
-    min_distance: float = MIN_DISTANCE
+    min_distance: float = MIN_DISTANCE,
+    rng=random
 ) -> tuple[int, int, int]:
-    
+
     """Calculate the contrast color based on the background color"""
-    bg_r, bg_g, bg_b = bg_color
-    # Compute distance to each candidate
-    dist_list = []
-    for name, (r, g, b) in candidates.items():
-        dist = math.sqrt((bg_r - r)**2 + (bg_g - g)**2 + (bg_b - b)**2)
-        dist_list.append((dist, (r, g, b)))
+    if candidates is CANDIDATE_COLORS:
+        rgbs, candidate_array = _CANDIDATE_RGB, _CANDIDATE_ARRAY
+    else:
+        rgbs = [tuple(rgb) for rgb in candidates.values()]
+        candidate_array = np.array(rgbs, dtype=np.float64).reshape(-1, 3)
+
+    # Compute distance to every candidate at once
+    dists = np.sqrt(((candidate_array - np.asarray(bg_color, dtype=np.float64)) ** 2).sum(axis=1))
 
     # Filter for good contrast
-    good = [rgb for dist, rgb in dist_list if dist >= min_distance]
+    good = np.flatnonzero(dists >= min_distance).tolist()
 
     if good:
-        return random.choice(good)
+        return rgbs[rng.choice(good)]
     else:
         # fallback: pick the single farthest color
-        farthest = max(dist_list, key=lambda x: x[0])
-        return farthest[1]
+        return rgbs[int(np.argmax(dists))]
 
 
-def get_contrast_color(image: Image.Image, x: int, y: int, w: int, h: int) -> tuple[int, int, int]:
+def get_contrast_color(image: Image.Image, x: int, y: int, w: int, h: int, rng=random) -> tuple[int, int, int]:
     """Get color that contrasts with background region with safety checks"""
-    
+
     # Ensure crop coordinates stay within image bounds
     x0 = max(0, x)
     y0 = max(0, y)
@@ -58,6 +105,5 @@ def get_contrast_color(image: Image.Image, x: int, y: int, w: int, h: int) -> tu
     if x0 >= x1 or y0 >= y1:
         return (0, 0, 0)  # Fallback color
 
-    region = image.crop((x0, y0, x1, y1))
-    avg_color = calculate_average_bg_color(region)
-    return contrast_color(avg_color)
+    avg_color = get_background_stats(image).region_mean(x0, y0, x1, y1)
+    return contrast_color(avg_color, rng=rng)
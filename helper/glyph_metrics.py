@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from PIL.ImageFont import FreeTypeFont
+import dotenv
+import json
+import os
+import sys
+
+from helper.profiling import stage
+
+
+dotenv.load_dotenv()
+
+GLYPH_METRICS_CACHE_MAX_ENTRIES = int(os.getenv("GLYPH_METRICS_CACHE_MAX_ENTRIES", default=500000))
+GLYPH_METRICS_CACHE_FILE = os.getenv("GLYPH_METRICS_CACHE_FILE", default="")
+
+BBox = tuple[int, int, int, int]
+
+
+class GlyphMetricsCache:
+    """
+    LRU cache of `font.getbbox(word)` results keyed by (font path, size, word),
+    so repeated words skip HarfBuzz/Raqm shaping. Can be saved to and
+    loaded from a JSON file to warm it ahead of time.
+    """
+
+    def __init__(self, max_entries: int = GLYPH_METRICS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._bboxes: OrderedDict[tuple[str, int, str], BBox] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_bbox(self, font: FreeTypeFont, word: str) -> BBox:
+        """Return `font.getbbox(word)`, measuring it only on a miss"""
+        key = (font.path, font.size, word)
+        bbox = self._bboxes.get(key)
+        if bbox is not None:
+            self._bboxes.move_to_end(key)
+            self.hits += 1
+            return bbox
+
+        self.misses += 1
+        with stage("getbbox"):
+            bbox = self._bboxes[key] = font.getbbox(word)
+        if len(self._bboxes) > self.max_entries:
+            self._bboxes.popitem(last=False)
+        return bbox
+
+    def warm(self, fonts: list[FreeTypeFont], words: list[str]) -> None:
+        """Measure every word with every font"""
+        for font in fonts:
+            for word in words:
+                self.get_bbox(font, word)
+
+    def save(self, file_path: str) -> None:
+        """Write the entries as JSON, replacing `file_path` only once the file is complete"""
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([[path, size, word, list(bbox)] for (path, size, word), bbox in self._bboxes.items()],
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, file_path)
+
+    def load(self, file_path: str) -> None:
+        """Merge the entries saved in `file_path` into the cache"""
+        with open(file_path, encoding="utf-8") as f:
+            entries = json.load(f)
+        for path, size, word, bbox in entries:
+            self._bboxes[(path, size, word)] = tuple(bbox)
+        if len(self._bboxes) > self.max_entries:
+            print(f"Warning: '{file_path}' holds {len(entries)} glyph metrics, more than the cache keeps "
+                  f"({self.max_entries}, see GLYPH_METRICS_CACHE_MAX_ENTRIES); the oldest are dropped.", file=sys.stderr)
+        while len(self._bboxes) > self.max_entries:
+            self._bboxes.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._bboxes),
+        }
+
+    def __len__(self) -> int:
+        return len(self._bboxes)
+
+
+# Process-wide cache shared by every caller of `get_bbox`.
+GLYPH_METRICS_CACHE = GlyphMetricsCache()
+if GLYPH_METRICS_CACHE_FILE and os.path.exists(GLYPH_METRICS_CACHE_FILE):
+    GLYPH_METRICS_CACHE.load(GLYPH_METRICS_CACHE_FILE)
+
+
+def get_bbox(font: FreeTypeFont, word: str) -> BBox:
+    """Get the bbox of `word` from the process-wide glyph metrics cache"""
+    return GLYPH_METRICS_CACHE.get_bbox(font, word)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    from helper.asset_registry import get_registry
+    from helper.get_random import FONT_EXTENSIONS
+    from helper.font_provider import FontCache
+    from helper.utils import read_text_file
+    from helper.khnormal import khnormal_word
+
+    parser = argparse.ArgumentParser(description="Warm a glyph metrics cache file ahead of time")
+    parser.add_argument("text_file", help="Text file or corpus to take words from")
+    parser.add_argument("-o", "--output", required=True, help="Cache file to write (merged into if it exists)")
+    parser.add_argument("--font-dir", default="fonts/", help="Directory containing font files")
+    parser.add_argument("--sizes", default="20,80", help="Inclusive font size range, e.g. 20,80")
+    parser.add_argument("--words", type=int, default=None,
+                        help="Number of random words to measure (0 for all; default: as many as fit in --max-entries)")
+    parser.add_argument("--max-entries", type=int, default=GLYPH_METRICS_CACHE_MAX_ENTRIES,
+                        help="Size of the cache (default: GLYPH_METRICS_CACHE_MAX_ENTRIES, which also caps it when loading)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    min_size, max_size = map(int, args.sizes.split(','))
+    font_entries = list(get_registry(args.font_dir, FONT_EXTENSIONS))
+    cache = GlyphMetricsCache(args.max_entries)
+    if os.path.exists(args.output):
+        cache.load(args.output)
+
+    # Every (font, size) pair measures every word; anything past the cap would just be evicted again
+    combinations = len(font_entries) * (max_size - min_size + 1)
+    room = (args.max_entries - len(cache)) // max(combinations, 1)
+    text_words = read_text_file(args.text_file)
+    words = list(text_words)
+    n_words = len(words) if args.words == 0 else min(room if args.words is None else args.words, len(words))
+    if n_words > room or n_words == 0:
+        parser.error(f"{len(font_entries)} fonts x {max_size - min_size + 1} sizes x {n_words} words don't fit in the "
+                     f"{args.max_entries - len(cache)} free cache entries; pass fewer --words or --sizes, or raise --max-entries "
+                     "(and GLYPH_METRICS_CACHE_MAX_ENTRIES to match)")
+    words = random.Random(args.seed).sample(words, n_words)
+    if not getattr(text_words, "normalized", False):
+        words = [khnormal_word(w) for w in words]
+    print(f"Measuring {n_words} words with {len(font_entries)} fonts at {max_size - min_size + 1} sizes")
+
+    fonts = FontCache(max_entries=1)
+    for font_entry in font_entries:
+        for size in range(min_size, max_size + 1):
+            cache.warm([fonts.get(font_entry.path, size)], words)
+        print(f"Measured {font_entry.path} ({len(cache)} entries)")
+
+    cache.save(args.output)
+    print(f"Saved {len(cache)} entries to {args.output}")
@@ -0,0 +1,90 @@
+"""
+Image encoding for the output sinks.
+
+`ImageEncoder` turns a rendered image into file bytes in the configured
+format (PNG with a chosen compress_level, JPEG or WebP with a quality)
+and keeps encode-time metrics. If the augmentation produced the final
+pixels by decoding a JPEG (see `AugmentationPipeline.run`), those JPEG
+bytes can be stored as they are instead of being re-encoded.
+"""
+import io
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+from helper.profiling import stage
+
+# Format name -> (Pillow format, file extension)
+IMAGE_FORMATS = {
+    "png": ("PNG", "png"),
+    "jpeg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp"),
+}
+
+
+class EncodedImage(NamedTuple):
+    data: bytes
+    ext: str  # file extension without the dot
+    seconds: float  # time spent encoding (0 when bytes were reused)
+    reused: bool  # `data` are the augmentation's JPEG bytes
+
+
+class ImageEncoder:
+    """Encodes images to bytes and records how long that takes. Thread-safe."""
+
+    def __init__(self, image_format: str = "png", png_compress_level: int = 6, quality: int = 90, reuse_jpeg: bool = False):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown IMAGE_FORMAT: {image_format!r} (expected one of {', '.join(IMAGE_FORMATS)})")
+        self.image_format = image_format
+        self.png_compress_level = png_compress_level
+        self.quality = quality
+        self.reuse_jpeg = reuse_jpeg
+        self._lock = threading.Lock()
+        self._images = 0
+        self._reused = 0
+        self._seconds = 0.0
+        self._max_seconds = 0.0
+        self._bytes = 0
+
+    def extension(self, jpeg: Optional[bytes] = None) -> str:
+        """File extension `encode` will use for an image with these (optional) JPEG bytes"""
+        if jpeg is not None and self.reuse_jpeg:
+            return "jpg"
+        return IMAGE_FORMATS[self.image_format][1]
+
+    def encode(self, img: Image.Image, jpeg: Optional[bytes] = None) -> EncodedImage:
+        if jpeg is not None and self.reuse_jpeg:
+            encoded = EncodedImage(jpeg, "jpg", 0.0, True)
+        else:
+            pil_format, ext = IMAGE_FORMATS[self.image_format]
+            if self.image_format == "png":
+                params = {"compress_level": self.png_compress_level}
+            else:
+                params = {"quality": self.quality}
+
+            started = time.perf_counter()
+            buf = io.BytesIO()
+            with stage("encode"):
+                img.save(buf, format=pil_format, **params)
+            encoded = EncodedImage(buf.getvalue(), ext, time.perf_counter() - started, False)
+
+        with self._lock:
+            self._images += 1
+            self._reused += encoded.reused
+            self._seconds += encoded.seconds
+            self._max_seconds = max(self._max_seconds, encoded.seconds)
+            self._bytes += len(encoded.data)
+        return encoded
+
+    def stats(self) -> dict:
+        """Totals since creation: images, reused JPEGs, encode seconds (total and max) and bytes"""
+        with self._lock:
+            return {
+                "images": self._images,
+                "reused": self._reused,
+                "seconds": self._seconds,
+                "max_seconds": self._max_seconds,
+                "bytes": self._bytes,
+            }
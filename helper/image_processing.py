@@ -3,53 +3,101 @@ import random
 from PIL import Image
 import cv2
 import math
+from typing import Optional
+from helper.rng import numpy_rng
+from helper.profiling import stage
 
 
-def apply_motion_blur(img: Image.Image, possible_size=(3, 5), posssibility=0.3) -> Image.Image:
-    if random.random() < posssibility:
-        img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+# All augmentations draw from `rng`: the global `random` (and `np.random`)
+# by default, or a per-sample stream from helper/rng.py.
+
+
+def _motion_blur(img_cv: np.ndarray, possible_size=(3, 5), rng=random) -> None:
+    """Blur `img_cv` in place with a random horizontal or vertical motion kernel."""
+    size = rng.choice(possible_size)
+    kernel_motion_blur = np.zeros((size, size))
+
+    # Randomly choose horizontal or vertical motion blur
+    if rng.choice(["horizontal", "vertical"]) == "horizontal":
+        kernel_motion_blur[int((size - 1) / 2), :] = np.ones(size)
+    else:
+        kernel_motion_blur[:, int((size - 1) / 2)] = np.ones(size)
+
+    # Normalize the kernel
+    kernel_motion_blur /= size
+
+    # Apply the kernel to the image
+    cv2.filter2D(img_cv, -1, kernel_motion_blur, dst=img_cv)
+
+
+def _artifact(img_cv: np.ndarray, possible_compression=(50, 90), rng=random) -> bytes:
+    """Round-trip the BGR image `img_cv` through JPEG in place. Returns the JPEG bytes."""
+    # Randomly choose a compression level
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 
+                    rng.randint(*possible_compression)]
+    
+    # Encode the image to apply the artifact
+    _, encimg = cv2.imencode('.jpg', img_cv, encode_param)
+    
+    # Decode the image to apply the artifact
+    np.copyto(img_cv, cv2.imdecode(encimg, 1))
+    return encimg.tobytes()
+
+
+def _brightness_contrast(img_cv: np.ndarray, alpha_range=(0.8, 1.2), beta_range=(-50, 50), rng=random) -> bool:
+    """Apply a random alpha (contrast) / beta (brightness) to `img_cv` in place. Returns whether pixels changed."""
+    alpha = numpy_rng(rng).uniform(*alpha_range)  # Contrast control
+    beta = numpy_rng(rng).uniform(*beta_range)    # Brightness control
 
-        size = random.choice(possible_size)
-        kernel_motion_blur = np.zeros((size, size))
+    if alpha == 1 and beta == 0:
+        return False  # identity, e.g. ALPHA_RANGE=1,1 and BETA_RANGE=0,0
 
-        # Randomly choose horizontal or vertical motion blur
-        if random.choice(["horizontal", "vertical"]) == "horizontal":
-            kernel_motion_blur[int((size - 1) / 2), :] = np.ones(size)
-        else:
-            kernel_motion_blur[:, int((size - 1) / 2)] = np.ones(size)
+    cv2.convertScaleAbs(img_cv, dst=img_cv, alpha=alpha, beta=beta)
+    return True
 
-        # Normalize the kernel
-        kernel_motion_blur /= size
 
-        # Apply the kernel to the image
-        img_cv = cv2.filter2D(img_cv, -1, kernel_motion_blur)
+def _color_jitter(img_cv: np.ndarray, hue_delta: int = 10, sat_scale=(0.8, 1.2), val_scale=(0.8, 1.2), bgr: bool = True, rng=random) -> None:
+    """Jitter hue, saturation and value of `img_cv` in place (one HSV round trip)."""
+    hsv = cv2.cvtColor(img_cv, cv2.COLOR_BGR2HSV if bgr else cv2.COLOR_RGB2HSV)
 
+    # One lookup table per HSV channel, so the jitter is a single pass over the pixels.
+    levels = np.arange(256, dtype=np.int16)
+
+    # Hue: add random between -hue_delta and +hue_delta (loop around 0–180)
+    h = (levels + rng.randint(-hue_delta, hue_delta)) % 180
+
+    # Saturation: scale by random factor
+    s = np.clip(levels.astype(np.float32) * rng.uniform(*sat_scale), 0, 255).astype(np.uint8)
+
+    # Value: scale by random factor
+    v = np.clip(levels.astype(np.float32) * rng.uniform(*val_scale), 0, 255).astype(np.uint8)
+
+    lut = np.stack([h, s, v], axis=1).astype(np.uint8).reshape(1, 256, 3)
+    cv2.LUT(hsv, lut, dst=hsv)
+
+    cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR if bgr else cv2.COLOR_HSV2RGB, dst=img_cv)
+
+
+def apply_motion_blur(img: Image.Image, possible_size=(3, 5), posssibility=0.3, rng=random) -> Image.Image:
+    if rng.random() < posssibility:
+        img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+        _motion_blur(img_cv, possible_size, rng)
         return Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
     
     return img
 
 
-def apply_artifact(img: Image.Image, possible_compression=(50, 90), posssibility=0.5) -> Image.Image:
+def apply_artifact(img: Image.Image, possible_compression=(50, 90), posssibility=0.5, rng=random) -> Image.Image:
 
-    if random.random() < posssibility:
+    if rng.random() < posssibility:
         img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-        
-        # Randomly choose a compression level
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 
-                        random.randint(*possible_compression)]
-        
-        # Encode the image to apply the artifact
-        _, encimg = cv2.imencode('.jpg', img_cv, encode_param)
-        
-        # Decode the image to apply the artifact
-        img_cv = cv2.imdecode(encimg, 1)
-
+        _artifact(img_cv, possible_compression, rng)
         return Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
     
     return img
 
 
-def rand_brightness_contrast(image: Image.Image, alpha_range=(0.8, 1.2), beta_range=(-50, 50)) -> Image.Image:
+def rand_brightness_contrast(image: Image.Image, alpha_range=(0.8, 1.2), beta_range=(-50, 50), rng=random) -> Image.Image:
     """
     Adjust the brightness and contrast of an image using alpha (contrast) and beta (brightness).
 
@@ -57,19 +105,15 @@ def rand_brightness_contrast(image: Image.Image, alpha_range=(0.8, 1.2), beta_ra
         image (PIL.Image.Image): The input image.
         alpha_range (tuple): Min and max multiplier for contrast adjustment.
         beta_range (tuple): Min and max value for brightness adjustment.
+        rng: Random source (see helper/rng.py).
 
     Returns:
         PIL.Image.Image: The adjusted image.
     """
 
     img_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-    alpha = np.random.uniform(*alpha_range)  # Contrast control
-    beta = np.random.uniform(*beta_range)    # Brightness control
-
-    adjusted = cv2.convertScaleAbs(img_cv, alpha=alpha, beta=beta)
-
-    return Image.fromarray(cv2.cvtColor(adjusted, cv2.COLOR_BGR2RGB))
+    _brightness_contrast(img_cv, alpha_range, beta_range, rng)
+    return Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
 
 
 def apply_color_jitter(
@@ -77,7 +121,8 @@ def apply_color_jitter(
     possibility: float = 0.3,
     hue_delta: int = 10,
     sat_scale = (0.8, 1.2),
-    val_scale = (0.8, 1.2)
+    val_scale = (0.8, 1.2),
+    rng = random
 ) -> Image.Image:
     """
     Randomly jitter the color of `img` by moving to HSV and back.
@@ -88,30 +133,95 @@ def apply_color_jitter(
       hue_delta:   max ± shift in hue channel (0-180 scale).
       sat_scale:  (min, max) scale factor for saturation.
       val_scale:  (min, max) scale factor for value/brightness.
+      rng:        random source (see helper/rng.py).
     
     Returns:
       A new PIL Image with color jitter applied (or the original).
     """
-    if random.random() > possibility:
+    if rng.random() > possibility:
         return img  # no change
 
     arr = np.array(img.convert("RGB"), dtype=np.uint8)
-    hsv = cv2.cvtColor(arr, cv2.COLOR_RGB2HSV).astype(np.int16)
+    _color_jitter(arr, hue_delta, sat_scale, val_scale, bgr=False, rng=rng)
+    return Image.fromarray(arr)
 
-    # Hue: add random between -hue_delta and +hue_delta (loop around 0–180)
-    h = hsv[:, :, 0]
-    h = (h + random.randint(-hue_delta, hue_delta)) % 180
-
-    # Saturation: scale by random factor
-    s = hsv[:, :, 1].astype(np.float32)
-    s = np.clip(s * random.uniform(*sat_scale), 0, 255).astype(np.uint8)
-
-    # Value: scale by random factor
-    v = hsv[:, :, 2].astype(np.float32)
-    v = np.clip(v * random.uniform(*val_scale), 0, 255).astype(np.uint8)
-
-    jittered_hsv = np.stack([h, s, v], axis=2).astype(np.uint8)
 
-    jittered_rgb = cv2.cvtColor(jittered_hsv, cv2.COLOR_HSV2RGB)
+class AugmentationPipeline:
+    """
+    Applies artifact, motion blur, brightness/contrast and color jitter in
+    one pass: the image is converted to a BGR NumPy buffer once, every
+    enabled op works in place on that buffer, and it is converted back
+    once at the end. Probabilities and random draws match calling
+    `apply_artifact`, `apply_motion_blur`, `rand_brightness_contrast` and
+    `apply_color_jitter` one after the other. With `artifact_last` the
+    JPEG artifact runs after the other ops instead, so its bytes always
+    match the final image and can be stored as is (see `run`).
+    """
 
-    return Image.fromarray(jittered_rgb)
+    def __init__(
+        self,
+        artifact_possibility: float = 0.5,
+        jpeg_compression_range=(50, 90),
+        motion_blur_possibility: float = 0.3,
+        motion_blur_kernel_size_range=(3, 5),
+        alpha_range=(0.8, 1.2),
+        beta_range=(-50, 50),
+        color_jitter_possibility: float = 0.3,
+        hue_delta: int = 10,
+        sat_scale=(0.8, 1.2),
+        val_scale=(0.8, 1.2),
+        artifact_last: bool = False,
+    ):
+        self.artifact_possibility = artifact_possibility
+        self.jpeg_compression_range = jpeg_compression_range
+        self.motion_blur_possibility = motion_blur_possibility
+        self.motion_blur_kernel_size_range = motion_blur_kernel_size_range
+        self.alpha_range = alpha_range
+        self.beta_range = beta_range
+        self.color_jitter_possibility = color_jitter_possibility
+        self.hue_delta = hue_delta
+        self.sat_scale = sat_scale
+        self.val_scale = val_scale
+        self.artifact_last = artifact_last
+
+    def __call__(self, img: Image.Image, rng=random) -> Image.Image:
+        return self.run(img, rng)[0]
+
+    def run(self, img: Image.Image, rng=random) -> tuple[Image.Image, Optional[bytes]]:
+        """
+        Augment `img` with random draws from `rng`. Also returns the
+        artifact's JPEG bytes if the artifact was the last op that changed
+        pixels (the bytes then decode to exactly the returned image), else None.
+        """
+        img_cv = cv2.cvtColor(np.asarray(img.convert("RGB")), cv2.COLOR_RGB2BGR)
+        jpeg = self._augment_bgr(img_cv, rng)
+        cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB, dst=img_cv)
+        return Image.fromarray(img_cv), jpeg
+
+    def _augment_bgr(self, img_cv: np.ndarray, rng) -> Optional[bytes]:
+        """Apply the enabled ops to the BGR buffer `img_cv` in place; returns the JPEG bytes for `run`"""
+        jpeg = None
+
+        if not self.artifact_last and rng.random() < self.artifact_possibility:
+            with stage("augment.artifact"):
+                jpeg = _artifact(img_cv, self.jpeg_compression_range, rng)
+
+        if rng.random() < self.motion_blur_possibility:
+            with stage("augment.motion_blur"):
+                _motion_blur(img_cv, self.motion_blur_kernel_size_range, rng)
+            jpeg = None
+
+        with stage("augment.brightness_contrast"):
+            if _brightness_contrast(img_cv, self.alpha_range, self.beta_range, rng):
+                jpeg = None
+
+        if not rng.random() > self.color_jitter_possibility:
+            with stage("augment.color_jitter"):
+                _color_jitter(img_cv, self.hue_delta, self.sat_scale, self.val_scale, rng=rng)
+            jpeg = None
+
+        if self.artifact_last and rng.random() < self.artifact_possibility:
+            with stage("augment.artifact"):
+                jpeg = _artifact(img_cv, self.jpeg_compression_range, rng)
+
+        return jpeg
@@ -3,6 +3,7 @@
 # Licensed under MIT license: https://opensource.org/licenses/MIT
 
 import enum, re, regex
+from functools import lru_cache
 
 class Cats(enum.Enum):
     Other = 0; Base = 1; Robat = 2; Coeng = 3;
@@ -102,6 +103,23 @@ khres = {   # useful regular sub expressions used later
 for i in range(3):
     khres = {k: v.format(**khres) for k, v in khres.items()}
 
+# Patterns used by khnormal, compiled once at import instead of on every syllable
+_re_fcoeng = re.compile("([\u17B6-\u17C5]\u17D2)")
+_re_multi_invisible = re.compile("(\u200D?\u17D2)[\u17D2\u200C\u200D]+")
+_re_confusable = re.compile("\u17BE\u17B6")
+_re_compound_ii = re.compile("\u17C1([\u17BB-\u17BD]?)\u17B8")
+_re_compound_aa = re.compile("\u17C1([\u17BB-\u17BD]?)\u17B6")
+_re_oe_u = re.compile("(\u17BE)(\u17BB)")
+_re_strong_u = re.compile(("((?:{STRONG})[\u17C1-\u17C5]?)\u17BB" + \
+                           "(?={VA}|\u17D0)").format(**khres), re.X)
+_re_nstrong_u = re.compile(("((?:{NSTRONG})[\u17C1-\u17C5]?)\u17BB" + \
+                            "(?={VA}|\u17D0)").format(**khres), re.X)
+_re_coeng_ro = re.compile("(\u17D2\u179A)(\u17D2[\u1780-\u17B3])")
+_re_coeng_da = re.compile("(\u17D2)\u178A")
+_re_lunar_old = re.compile("(\u17E1?)([\u17E0-\u17E9])\u17D2\u17D4")
+_re_lunar_new = re.compile("\u17D4\u17D2(\u17E1?)([\u17E0-\u17E9])")
+_re_lunar_bar = re.compile("\u17D4\u17D2\u17D4")
+
 def charcat(c):
     ''' Returns the Khmer character category for a single char string'''
     o = ord(c)
@@ -124,7 +142,7 @@ def khnormal(txt, lang="km") -> list:
     ''' Returns khmer normalised string, without fixing or marking errors'''
     # Mark final coengs in Middle Khmer
     if lang == "xhm":
-        txt = re.sub(r"([\u17B6-\u17C5]\u17D2)", "\u200D\\1", txt)
+        txt = _re_fcoeng.sub("\u200D\\1", txt)
     # Categorise every character in the string
     charcats = [charcat(c) for c in txt]
 
@@ -151,34 +169,35 @@ def khnormal(txt, lang="km") -> list:
         newindices = sorted(range(i, j), key=lambda e:(charcats[e].value, e))
         replaces = "".join(txt[n] for n in newindices)
 
-        replaces = re.sub("(\u200D?\u17D2)[\u17D2\u200C\u200D]+",
-                          r"\1", replaces)      # remove multiple invisible chars
-        replaces = re.sub("\u17BE\u17B6", "\u17C4\u17B8", replaces)  # confusable vowels
+        replaces = _re_multi_invisible.sub(r"\1", replaces)      # remove multiple invisible chars
+        replaces = _re_confusable.sub("\u17C4\u17B8", replaces)  # confusable vowels
         # map compoound vowel sequences to compounds with -u before to be converted
-        replaces = re.sub("\u17C1([\u17BB-\u17BD]?)\u17B8", "\u17BE\\1", replaces)
-        replaces = re.sub("\u17C1([\u17BB-\u17BD]?)\u17B6", "\u17C4\\1", replaces)
-        replaces = re.sub("(\u17BE)(\u17BB)", r"\2\1", replaces)
+        replaces = _re_compound_ii.sub("\u17BE\\1", replaces)
+        replaces = _re_compound_aa.sub("\u17C4\\1", replaces)
+        replaces = _re_oe_u.sub(r"\2\1", replaces)
         # Replace -u + upper vowel with consonant shifter
-        replaces = re.sub(("((?:{STRONG})[\u17C1-\u17C5]?)\u17BB" + \
-                          "(?={VA}|\u17D0)").format(**khres), "\\1\u17CA",
-                          replaces, flags=re.X)
-        replaces = re.sub(("((?:{NSTRONG})[\u17C1-\u17C5]?)\u17BB" + \
-                          "(?={VA}|\u17D0)").format(**khres), "\\1\u17C9",
-                          replaces, flags=re.X)
-        replaces = re.sub("(\u17D2\u179A)(\u17D2[\u1780-\u17B3])",
-                          r"\2\1", replaces)    # coeng ro second
-        replaces = re.sub("(\u17D2)\u178A", "\\1\u178F", replaces)  # coeng da->ta
+        replaces = _re_strong_u.sub("\\1\u17CA", replaces)
+        replaces = _re_nstrong_u.sub("\\1\u17C9", replaces)
+        replaces = _re_coeng_ro.sub(r"\2\1", replaces)    # coeng ro second
+        replaces = _re_coeng_da.sub("\\1\u178F", replaces)  # coeng da->ta
         # convert lunar dates from old style to use lunar date symbols
-        replaces = re.sub("(\u17E1?)([\u17E0-\u17E9])\u17D2\u17D4",
-                lambda m:lunar(m, 0x19E0), replaces)
-        replaces = re.sub("\u17D4\u17D2(\u17E1?)([\u17E0-\u17E9])",
-                lambda m:lunar(m, 0x19F0), replaces)
-        replaces = re.sub("\u17D4\u17D2\u17D4", "\u19F0", replaces)
+        replaces = _re_lunar_old.sub(lambda m:lunar(m, 0x19E0), replaces)
+        replaces = _re_lunar_new.sub(lambda m:lunar(m, 0x19F0), replaces)
+        replaces = _re_lunar_bar.sub("\u19F0", replaces)
         res.append(replaces)
         i = j
     return res
 
 
+# Large enough to hold every entry of the bundled dictionary (~38K words)
+KHNORMAL_CACHE_SIZE = 65536
+
+@lru_cache(maxsize=KHNORMAL_CACHE_SIZE)
+def khnormal_word(txt, lang="km") -> str:
+    ''' Returns the normalised form of `txt` as a single string, memoised per input '''
+    return "".join(khnormal(txt, lang=lang))
+
+
 testsyl = regex.compile(("({B}\u17CC?{COENG}?{SHIFT}?{V}{MS}?[\u17C7\u17C8]?|" +
        "[\u17A3\u17A4\u17B4\u17B5]|[^\u1780-\u17D2])").format(**khres), regex.X)
 testsylx = regex.compile(("({B}\u17CC?{COENG}?{SHIFTX}?{VX}{MSX}?[\u17C7\u17C8]?{FCOENG}?|" +
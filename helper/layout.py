@@ -0,0 +1,132 @@
+from typing import Iterable, NamedTuple
+import random
+
+import numpy as np
+from PIL.ImageFont import FreeTypeFont
+
+from helper.font_provider import get_font
+from helper.glyph_metrics import get_bbox
+from helper.rng import numpy_rng
+from helper.get_random import get_random_font, get_random_img_padding, get_random_line_spacing, get_random_word_padding
+
+# Column order of the per-word re-roll events (same order as they are applied).
+_NEW_PADDING, _NEW_LINE_SPACING, _NEW_FONT, _NEW_WORD_PADDING, _NEW_Y, _NEW_X, _NEW_COLOR = range(7)
+
+
+class Placement(NamedTuple):
+    word: str
+    x: int
+    y: int
+    font: FreeTypeFont
+    bbox: tuple[int, int, int, int]  # font.getbbox(word), relative to (x, y)
+    line: int  # index into PageLayout.lines
+    new_color: bool  # a new text color is picked before drawing this word
+
+
+class PageLayout(NamedTuple):
+    placements: list[Placement]
+    lines: list[list[int]]  # indices into `placements`, one list per line
+    sampled: int  # words pulled from the word source
+
+
+def layout_words(
+    words: Iterable[str],
+    page_size: tuple[int, int],
+    font_dir: str,
+    font_path: str,
+    font_size: int,
+    x_padding: int,
+    y_padding: int,
+    line_spacing: int,
+    word_padding: int,
+    min_img_padding: int,
+    max_img_padding: int,
+    min_line_spacing: int,
+    max_line_spacing: int,
+    min_word_padding: int,
+    max_word_padding: int,
+    possibilities_for_new_padding: float,
+    possibilities_for_new_line_spacing: float,
+    possibilities_for_new_word_padding: float,
+    possibilities_for_new_font: float,
+    possibilities_for_new_y: float, new_y_range: tuple[int, int],
+    possibilities_for_new_x: float, new_x_range: tuple[int, int],
+    possibilities_for_new_color: float,
+    rng=random,
+) -> PageLayout:
+    """
+    Phase one of drawing a page: flow `words` into lines and return where
+    each one goes, without drawing anything.
+
+    Words are pulled from `words` one at a time and measured only when
+    they are about to be placed, and pulling stops at the first word that
+    no longer fits vertically, so at most one pulled word per page is not
+    placed and `words` may be a lazy (even endless) iterator.
+    All random draws come from `rng` (see helper/rng.py).
+    """
+    page_width, page_height = page_size
+    probabilities = np.array([
+        possibilities_for_new_padding,
+        possibilities_for_new_line_spacing,
+        possibilities_for_new_font,
+        possibilities_for_new_word_padding,
+        possibilities_for_new_y,
+        possibilities_for_new_x,
+        possibilities_for_new_color,
+    ])
+    np_rng = numpy_rng(rng)
+
+    font = get_font(font_path, font_size)
+    placements: list[Placement] = []
+    lines: list[list[int]] = []
+    current_line: list[int] = []
+    current_x = x_padding
+    current_y = y_padding
+    max_line_height = 0
+    sampled = 0
+
+    for word in words:
+        sampled += 1
+
+        # Re-rolls happen before the word is measured.
+        event = (np_rng.random(len(probabilities)) < probabilities).tolist()
+        if event[_NEW_PADDING]:
+            x_padding, y_padding = get_random_img_padding(min_img_padding=min_img_padding, max_img_padding=max_img_padding, rng=rng)
+        if event[_NEW_LINE_SPACING]:
+            line_spacing = get_random_line_spacing(min_line_spacing=min_line_spacing, max_line_spacing=max_line_spacing, rng=rng)
+        if event[_NEW_FONT]:
+            font_path = get_random_font(font_dir, rng)
+            font = get_font(font_path, font_size)
+        if event[_NEW_WORD_PADDING]:
+            word_padding = get_random_word_padding(min_word_padding=min_word_padding, max_word_padding=max_word_padding, rng=rng)
+        if event[_NEW_Y]:
+            current_y += rng.randint(*new_y_range)
+        if event[_NEW_X]:
+            current_x += rng.randint(*new_x_range)
+
+        bbox = get_bbox(font, word)
+        left, top, right, bottom = bbox
+        text_width = right - left
+
+        # If the word doesn't fit on this line, wrap to the next one.
+        # The wrapped word is placed even if it is wider than the line.
+        if current_x + text_width + word_padding > page_width - x_padding:
+            if current_line:
+                lines.append(current_line)
+                current_line = []
+            current_x = x_padding
+            current_y += max_line_height + line_spacing
+            max_line_height = 0
+
+        # If no more vertical space, stop pulling words
+        if current_y + bottom > page_height - y_padding:
+            break
+
+        current_line.append(len(placements))
+        placements.append(Placement(word, current_x, current_y, font, tuple(bbox), len(lines), event[_NEW_COLOR]))
+        current_x += text_width + word_padding
+        max_line_height = max(max_line_height, bottom - top)
+
+    if current_line:
+        lines.append(current_line)
+    return PageLayout(placements, lines, sampled)
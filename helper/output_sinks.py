@@ -0,0 +1,308 @@
+"""
+Output sinks for generated samples.
+
+A sink receives a `Sample` (rendered image plus label and XML text),
+encodes it with its `ImageEncoder` and stores it. `AsyncSink` wraps any
+sink with a bounded queue drained by background writer threads, so image
+encoding and file I/O overlap with rendering; `write` blocks when the
+queue is full. `ManifestSink` records every sample once it is written,
+for resuming an interrupted run (see helper/progress_manifest.py).
+"""
+import os
+import queue
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+from helper.image_encoder import EncodedImage, ImageEncoder, IMAGE_FORMATS
+from helper.profiling import stage
+from helper.progress_manifest import ProgressManifest
+from helper.shard_writer import ShardReader, ShardWriter
+
+# File extensions an image can be stored under
+IMAGE_EXTS = tuple(sorted({f".{ext}" for _, ext in IMAGE_FORMATS.values()}))
+
+
+class Sample(NamedTuple):
+    key: str  # e.g. "img_00001"
+    image: Image.Image
+    label: str  # YOLO label file contents
+    xml: str  # VOC XML file contents
+    jpeg: Optional[bytes] = None  # JPEG bytes that decode to `image`, see AugmentationPipeline.run
+
+
+class OutputSink:
+    """
+    Base class: stores samples somewhere. Implementations must be
+    thread-safe. `write` returns the encoded image once the sample is
+    stored (None if nothing was stored, or the write is asynchronous).
+    """
+
+    def write(self, sample: Sample) -> Optional[EncodedImage]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DirectorySink(OutputSink):
+    """One image, .txt and .xml file per sample in three directories"""
+
+    def __init__(self, image_dir: str, label_dir: str, xml_dir: str, encoder: ImageEncoder):
+        self.encoder = encoder
+        self.image_dir = image_dir
+        self.label_dir = label_dir
+        self.xml_dir = xml_dir
+        for d in (image_dir, label_dir, xml_dir):
+            os.makedirs(d, exist_ok=True)
+
+    def write(self, sample: Sample) -> EncodedImage:
+        encoded = self.encoder.encode(sample.image, sample.jpeg)
+        with open(os.path.join(self.image_dir, f"{sample.key}.{encoded.ext}"), "wb") as f:
+            f.write(encoded.data)
+        with open(os.path.join(self.label_dir, f"{sample.key}.txt"), "w") as f:
+            f.write(sample.label)
+        with open(os.path.join(self.xml_dir, f"{sample.key}.xml"), "w", encoding="utf-8") as f:
+            f.write(sample.xml)
+        return encoded
+
+
+class TarShardSink(OutputSink):
+    """Samples streamed into size-bounded tar shards (see helper/shard_writer.py)"""
+
+    def __init__(self, shard_dir: str, max_shard_bytes: int, encoder: ImageEncoder):
+        self.encoder = encoder
+        self._writer = ShardWriter(shard_dir, max_shard_bytes=max_shard_bytes)
+        self._lock = threading.Lock()
+
+    def write(self, sample: Sample) -> EncodedImage:
+        # Encode outside the lock so writer threads only serialize on the tar append.
+        encoded = self.encoder.encode(sample.image, sample.jpeg)
+        members = {
+            encoded.ext: encoded.data,
+            "txt": sample.label.encode("utf-8"),
+            "xml": sample.xml.encode("utf-8"),
+        }
+        with self._lock:
+            self._writer.write(sample.key, members)
+        return encoded
+
+    def close(self) -> None:
+        with self._lock:
+            self._writer.close()
+
+
+class KeyValueSink(OutputSink):
+    """
+    All samples in a single SQLite file, one row per key (image bytes,
+    image extension, txt and xml columns). Every row is committed as it
+    is written (cheap in WAL mode with synchronous=NORMAL); several
+    processes can write to the same file.
+    """
+
+    def __init__(self, db_path: str, encoder: ImageEncoder):
+        self.encoder = encoder
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS samples (key TEXT PRIMARY KEY, image BLOB, ext TEXT, txt TEXT, xml TEXT)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def write(self, sample: Sample) -> EncodedImage:
+        encoded = self.encoder.encode(sample.image, sample.jpeg)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?)",
+                             (sample.key, encoded.data, encoded.ext, sample.label, sample.xml))
+            self._db.commit()
+        return encoded
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class NullSink(OutputSink):
+    """Drops every sample; for benchmarking rendering without encoding or I/O"""
+
+    def __init__(self):
+        self.count = 0
+
+    def write(self, sample: Sample) -> None:
+        self.count += 1
+
+
+class ManifestSink(OutputSink):
+    """Records every sample `sink` has stored in `manifest`, after it is stored"""
+
+    def __init__(self, sink: OutputSink, manifest: ProgressManifest):
+        self.sink = sink
+        self.manifest = manifest
+
+    def write(self, sample: Sample) -> Optional[EncodedImage]:
+        encoded = self.sink.write(sample)
+        if encoded is not None:
+            self.manifest.record(sample.key, encoded.ext, encoded.data)
+        return encoded
+
+    def close(self) -> None:
+        self.sink.close()
+        self.manifest.close()
+
+
+class AsyncSink(OutputSink):
+    """
+    Feeds `sink` from a bounded queue on `num_threads` background threads.
+    `write` only queues the sample; `collect` tells which samples have been
+    stored since and which failed (with their errors), also after `close`.
+    """
+
+    def __init__(self, sink: OutputSink, num_threads: int = 2, queue_size: int = 16):
+        self.sink = sink
+        self._queue: queue.Queue[Optional[Sample]] = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._written: list[str] = []
+        self._failed: list[tuple[str, BaseException]] = []
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(num_threads)]
+        for t in self._threads:
+            t.start()
+
+    def _run(self) -> None:
+        while True:
+            sample = self._queue.get()
+            if sample is None:
+                break
+            try:
+                with stage("sink.write"):
+                    self.sink.write(sample)
+            except Exception as e:
+                with self._lock:
+                    self._failed.append((sample.key, e))
+            else:
+                with self._lock:
+                    self._written.append(sample.key)
+
+    def write(self, sample: Sample) -> None:
+        with stage("sink.wait"):
+            self._queue.put(sample)  # blocks while the writers are behind
+
+    def collect(self) -> tuple[list[str], list[tuple[str, BaseException]]]:
+        """Keys of the samples stored since the last call, and (key, error) of every write that failed since"""
+        with self._lock:
+            written, self._written = self._written, []
+            failed, self._failed = self._failed, []
+        return written, failed
+
+    def close(self) -> None:
+        """Wait for the queued samples and close `sink`. Failed writes are left for `collect`."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self.sink.close()
+
+
+def open_sink(
+    output_format: str,
+    image_dir: str, label_dir: str, xml_dir: str,
+    shard_dir: str, max_shard_bytes: int,
+    kv_path: str,
+    encoder: ImageEncoder,
+    writer_threads: int = 0, queue_size: int = 16,
+    manifest_path: str = "",
+) -> OutputSink:
+    """
+    Create the sink for `output_format` ("files", "tar", "kv" or "null"),
+    recording written samples in the manifest at `manifest_path` (if set),
+    async if `writer_threads` > 0
+    """
+    if output_format == "files":
+        sink = DirectorySink(image_dir, label_dir, xml_dir, encoder)
+    elif output_format == "tar":
+        sink = TarShardSink(shard_dir, max_shard_bytes, encoder)
+    elif output_format == "kv":
+        sink = KeyValueSink(kv_path, encoder)
+    elif output_format == "null":
+        sink = NullSink()
+    else:
+        raise ValueError(f"Unknown OUTPUT_FORMAT: {output_format!r}")
+
+    if manifest_path:
+        output = describe_output(output_format, image_dir, label_dir, xml_dir, shard_dir, kv_path)
+        sink = ManifestSink(sink, ProgressManifest(manifest_path, output))
+    if writer_threads > 0:
+        sink = AsyncSink(sink, num_threads=writer_threads, queue_size=queue_size)
+    return sink
+
+
+def describe_output(
+    output_format: str,
+    image_dir: str, label_dir: str, xml_dir: str,
+    shard_dir: str, kv_path: str,
+) -> dict:
+    """Where the sink for `output_format` stores samples; recorded in the progress manifest"""
+    if output_format == "files":
+        location = [os.path.abspath(d) for d in (image_dir, label_dir, xml_dir)]
+    elif output_format == "tar":
+        location = os.path.abspath(shard_dir)
+    elif output_format == "kv":
+        location = os.path.abspath(kv_path)
+    else:
+        location = ""
+    return {"format": output_format, "location": location}
+
+
+def stored_image_sizes(
+    output_format: str,
+    image_dir: str, label_dir: str, xml_dir: str,
+    shard_dir: str, kv_path: str,
+) -> dict[str, int]:
+    """Key -> image size in bytes of every sample already stored by the sink for `output_format` (one listing/index read)"""
+    if output_format == "files":
+        def entries(directory: str, exts: tuple[str, ...]) -> dict[str, os.DirEntry]:
+            if not os.path.isdir(directory):
+                return {}
+            with os.scandir(directory) as it:
+                return {os.path.splitext(e.name)[0]: e for e in it if e.name.endswith(exts)}
+        complete = entries(label_dir, (".txt",)).keys() & entries(xml_dir, (".xml",)).keys()
+        return {key: e.stat().st_size for key, e in entries(image_dir, IMAGE_EXTS).items() if key in complete}
+    if output_format == "tar":
+        if not os.path.isdir(shard_dir):
+            return {}
+        sizes = {}
+        for key, entry in ShardReader(shard_dir).index.items():
+            for ext in IMAGE_EXTS:
+                if ext[1:] in entry["members"]:
+                    sizes[key] = entry["members"][ext[1:]][1]
+        return sizes
+    if output_format == "kv":
+        if not os.path.exists(kv_path):
+            return {}
+        db = sqlite3.connect(kv_path, timeout=60)
+        try:
+            return dict(db.execute("SELECT key, length(image) FROM samples"))
+        except sqlite3.OperationalError:
+            return {}  # no samples table yet
+        finally:
+            db.close()
+    return {}
+
+
+def stored_keys(
+    output_format: str,
+    image_dir: str, label_dir: str, xml_dir: str,
+    shard_dir: str, kv_path: str,
+) -> set[str]:
+    """Keys of the samples already stored by the sink for `output_format` (one directory listing/index read)"""
+    return set(stored_image_sizes(output_format, image_dir, label_dir, xml_dir, shard_dir, kv_path))
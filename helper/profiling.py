@@ -0,0 +1,234 @@
+"""
+Opt-in per-stage instrumentation of the generation loop.
+
+With PROFILE_STAGES=true (or `enable()`), every `with stage("name"):`
+block records its wall time, the CPU time of the calling thread and the
+change in the number of allocated memory blocks (`sys.getallocatedblocks`,
+so allocations made by other threads at the same time are included).
+Wall times also go into a log-scale histogram. Stages may be nested;
+each one reports its inclusive time. When disabled, `stage()` returns a
+shared no-op context manager.
+
+Snapshots are plain dicts, so worker processes can send theirs to the
+parent, which merges them with `merge()` and prints `format_table()`.
+
+For a single sample, `python3 -m helper.profiling INDEX` runs
+`main.generate_sample(INDEX)` under cProfile (or pyinstrument, if installed),
+writing the sample synchronously so that encoding shows up in the profile.
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+import dotenv
+
+
+dotenv.load_dotenv()
+
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "false").lower() in ("1", "true", "yes")
+
+# Upper edges (ms) of the wall-time histogram buckets; the last bucket is open-ended.
+HISTOGRAM_EDGES_MS = (0.01, 0.03, 0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, 3000)
+
+
+class StageStats:
+    """Accumulated measurements of one stage"""
+
+    __slots__ = ("count", "wall", "cpu", "alloc", "max_wall", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.alloc = 0
+        self.max_wall = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_EDGES_MS) + 1)
+
+    def add(self, wall: float, cpu: float, alloc: int) -> None:
+        self.count += 1
+        self.wall += wall
+        self.cpu += cpu
+        self.alloc += alloc
+        self.max_wall = max(self.max_wall, wall)
+        self.histogram[bisect.bisect_left(HISTOGRAM_EDGES_MS, wall * 1000)] += 1
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "wall": self.wall, "cpu": self.cpu, "alloc": self.alloc,
+                "max_wall": self.max_wall, "histogram": list(self.histogram)}
+
+
+class StageProfiler:
+    """Thread-safe collection of StageStats by stage name"""
+
+    def __init__(self):
+        self._stats: dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, wall: float, cpu: float, alloc: int) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = StageStats()
+            stats.add(wall, cpu, alloc)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+class _Stage:
+    __slots__ = ("name", "_wall", "_cpu", "_blocks")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._blocks = sys.getallocatedblocks()
+        self._cpu = time.thread_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        PROFILER.record(self.name, wall, cpu, sys.getallocatedblocks() - self._blocks)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+# Process-wide profiler every `stage()` records into.
+PROFILER = StageProfiler()
+_enabled = PROFILE_STAGES
+
+
+def enable(enabled: bool = True) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def stage(name: str):
+    """Context manager timing the enclosed block as stage `name` (a no-op unless enabled)"""
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+
+def snapshot() -> dict[str, dict]:
+    return PROFILER.snapshot()
+
+
+def merge(snapshots: list[dict[str, dict]]) -> dict[str, dict]:
+    """Combine snapshots (e.g. one per worker process) into one"""
+    merged: dict[str, dict] = {}
+    for snap in snapshots:
+        for name, s in snap.items():
+            m = merged.get(name)
+            if m is None:
+                merged[name] = {**s, "histogram": list(s["histogram"])}
+                continue
+            for key in ("count", "wall", "cpu", "alloc"):
+                m[key] += s[key]
+            m["max_wall"] = max(m["max_wall"], s["max_wall"])
+            m["histogram"] = [a + b for a, b in zip(m["histogram"], s["histogram"])]
+    return merged
+
+
+def _percentile_ms(histogram: list[int], q: float) -> float:
+    """Upper bucket edge below which a fraction `q` of the calls fall"""
+    target = q * sum(histogram)
+    seen = 0
+    for i, n in enumerate(histogram):
+        seen += n
+        if seen >= target:
+            return HISTOGRAM_EDGES_MS[i] if i < len(HISTOGRAM_EDGES_MS) else float("inf")
+    return 0.0
+
+
+def format_table(snap: dict[str, dict]) -> str:
+    """Human-readable summary, slowest stage (total wall time) first"""
+    header = f"{'stage':<28}{'calls':>9}{'wall s':>10}{'mean ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>10}{'cpu s':>9}{'blocks/call':>13}"
+    rows = [header, "-" * len(header)]
+    for name, s in sorted(snap.items(), key=lambda item: item[1]["wall"], reverse=True):
+        count = max(s["count"], 1)
+        rows.append(
+            f"{name:<28}{s['count']:>9}{s['wall']:>10.3f}{s['wall'] / count * 1000:>10.3f}"
+            f"{'<' + format(_percentile_ms(s['histogram'], 0.5), 'g'):>9}{'<' + format(_percentile_ms(s['histogram'], 0.95), 'g'):>9}"
+            f"{s['max_wall'] * 1000:>10.2f}{s['cpu']:>9.3f}{s['alloc'] / count:>13.1f}"
+        )
+    return "\n".join(rows)
+
+
+def save_json(snap: dict[str, dict], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"histogram_edges_ms": HISTOGRAM_EDGES_MS, "stages": snap}, f, indent=2)
+
+
+def profile_sample(index: int, tool: str = "cprofile", output: Optional[str] = None, sort: str = "cumulative") -> None:
+    """Run `main.generate_sample(index)` under cProfile or pyinstrument and print (or save) the report"""
+    # Encode and write on this thread, so the profile covers them too
+    os.environ["OUTPUT_WRITER_THREADS"] = "0"
+    import main  # loads .env, fonts and the text file
+
+    if tool == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise SystemExit("pyinstrument is not installed (pip install pyinstrument); use --tool cprofile")
+        profiler = Profiler()
+        profiler.start()
+        main.generate_sample(index)
+        main.close_outputs()
+        profiler.stop()
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        else:
+            print(profiler.output_text(unicode=True, color=False))
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    main.generate_sample(index)
+    main.close_outputs()
+    profiler.disable()
+    if output:
+        profiler.dump_stats(output)
+    else:
+        pstats.Stats(profiler).sort_stats(sort).print_stats(40)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Profile the generation of a single sample.",
+        epilog="With SEED set, this renders exactly the same sample as the generator did."
+    )
+    parser.add_argument("index", type=int, help="Index of the sample to generate.")
+    parser.add_argument("--tool", choices=("cprofile", "pyinstrument"), default="cprofile", help="Profiler to use (default: cprofile).")
+    parser.add_argument("-o", "--output", default=None, help="Save the profile (.prof for cProfile, .html for pyinstrument) instead of printing it.")
+    parser.add_argument("--sort", default="cumulative", help="cProfile sort key (default: cumulative).")
+    args = parser.parse_args()
+    profile_sample(args.index, args.tool, args.output, args.sort)
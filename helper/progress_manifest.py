@@ -0,0 +1,88 @@
+"""
+Append-only manifest of written samples.
+
+The output sink records one JSON line per sample once the sample's files
+have been written: its key, image file name, image size in bytes and a
+checksum of the image bytes. `generator.py --resume` reads it to render
+only the indices that are missing. Lines are appended with a single
+O_APPEND write each, so several worker processes can share one manifest;
+a line torn by a crash is ignored when reading.
+
+Every process that opens the manifest first appends an `{"output": ...}`
+line describing the sink it writes to (see `describe_output` in
+helper/output_sinks.py). Each record belongs to the output of the last
+such line before it, so a manifest is never taken to describe an output
+that its records were not written to.
+"""
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+
+def sample_key(index: int) -> str:
+    """Key (file name without extension) of the sample with the given index"""
+    return f"img_{index:05d}"
+
+
+def checksum(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ProgressManifest:
+    """Appends a line per written sample to `path`, after one naming `output`. Thread- and process-safe."""
+
+    def __init__(self, path: str, output: Optional[dict] = None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # End a line torn by a crash, so it doesn't swallow the first new record.
+        if not _ends_with_newline(path):
+            os.write(self._fd, b"\n")
+        if output is not None:
+            os.write(self._fd, (json.dumps({"output": output}) + "\n").encode("utf-8"))
+
+    def record(self, key: str, ext: str, data: bytes) -> None:
+        line = json.dumps({"key": key, "image": f"{key}.{ext}", "size": len(data), "checksum": checksum(data)})
+        os.write(self._fd, (line + "\n").encode("utf-8"))
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def read_manifest(path: str) -> tuple[Optional[dict], dict[str, dict]]:
+    """
+    The output the manifest was last written for (None for a manifest
+    without output lines), and key -> latest record of every sample
+    written to that output. Raises OSError if the file can't be read.
+    """
+    output = None
+    records: dict[str, tuple[Optional[dict], dict]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "output" in record:
+                output = record["output"]
+            elif "key" in record:
+                records[record["key"]] = (output, record)
+    return output, {key: record for key, (record_output, record) in records.items() if record_output == output}
+
+
+def missing_indices(indices: Iterable[int], completed_keys: set[str]) -> list[int]:
+    """The indices whose sample key is not in `completed_keys`"""
+    return [i for i in indices if sample_key(i) not in completed_keys]
@@ -0,0 +1,60 @@
+"""
+Per-sample random number streams.
+
+Every helper that draws random numbers takes an `rng` argument that
+defaults to the global `random` module. Passing a `SampleRandom` made by
+`sample_rng(seed, index)` instead gives each sample its own counter-based
+(Philox) stream derived only from the seed and the sample index, so any
+process can regenerate sample `index` bit for bit, in any order.
+"""
+import random
+from typing import Optional
+
+import numpy as np
+
+
+class SampleRandom(random.Random):
+    """
+    `random.Random` whose numbers come from a NumPy Philox bit generator.
+    `self.np` is a `numpy.random.Generator` on the same stream, for the
+    helpers that draw NumPy arrays.
+    """
+
+    def __init__(self, seed: Optional[tuple[int, ...]] = None):
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2) -> None:
+        # SeedSequence hashes (base seed, index) into an independent Philox key; None draws fresh entropy.
+        self._bit_generator = np.random.Philox(np.random.SeedSequence(a))
+        self.np = np.random.Generator(self._bit_generator)
+        self.gauss_next = None
+
+    def random(self) -> float:
+        return self.np.random()
+
+    def getrandbits(self, k: int) -> int:
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        if k == 0:
+            return 0
+        if k <= 64:
+            return int(self._bit_generator.random_raw()) >> (64 - k)
+        words = -(-k // 64)
+        value = int.from_bytes(self._bit_generator.random_raw(words).tobytes(), "little")
+        return value >> (64 * words - k)
+
+    def getstate(self) -> dict:
+        return self._bit_generator.state
+
+    def setstate(self, state: dict) -> None:
+        self._bit_generator.state = state
+
+
+def sample_rng(seed: int, index: int) -> SampleRandom:
+    """The random stream of sample `index` under the base `seed` (both must be non-negative)"""
+    return SampleRandom((seed, index))
+
+
+def numpy_rng(rng):
+    """NumPy counterpart of `rng`: its Generator for a SampleRandom, the global `np.random` for the `random` module"""
+    return getattr(rng, "np", np.random)
@@ -0,0 +1,67 @@
+"""
+Append-only JSONL index of generated samples.
+
+One line per sample with its index, image file name, size, number of
+boxes and the fonts it was drawn with. `data_split.py --virtual` reads
+it to describe the splits without opening any image.
+"""
+import json
+import os
+from typing import Optional
+
+# Keys of a sample's `stats` (see main.generate_sample) that are stored in the index
+INDEX_FIELDS = ("image", "width", "height", "boxes", "fonts")
+
+
+class SampleIndexWriter:
+    """Appends one line per sample to `path`; meant for a single writer process."""
+
+    def __init__(self, path: str, flush_every: int = 100):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self._file = open(path, "a", encoding="utf-8")
+        self._pending = 0
+
+    def append(self, index: int, stats: dict) -> None:
+        record = {"index": index}
+        record.update((key, stats[key]) for key in INDEX_FIELDS if key in stats)
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._file.flush()
+            self._pending = 0
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_sample_index(path: str) -> dict[str, dict]:
+    """Map image file name -> latest record. A missing file gives an empty index; a torn last line is ignored."""
+    records: dict[str, dict] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "image" in record:
+                    records[record["image"]] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def open_sample_index(path: Optional[str]) -> Optional[SampleIndexWriter]:
+    """Writer for `path`, or None when the index is disabled (empty path)"""
+    return SampleIndexWriter(path) if path else None
@@ -0,0 +1,116 @@
+"""
+WebDataset-style tar shards.
+
+Every sample is stored as consecutive tar members sharing one key
+(`img_00001.png`, `img_00001.txt`, `img_00001.xml`), so shards can be
+streamed sequentially. Each writer also appends one JSON line per sample
+to its own `<shard prefix>.index.jsonl` with the byte offset and size of
+every member, so any sample can be read back without scanning the tar.
+"""
+import glob
+import io
+import json
+import os
+import tarfile
+import time
+from typing import Iterator, Optional
+
+TAR_BLOCK = tarfile.BLOCKSIZE
+
+
+class ShardWriter:
+    """Streams samples into size-bounded tar shards named `<prefix>-000000.tar`, ..."""
+
+    def __init__(self, out_dir: str, prefix: Optional[str] = None, max_shard_bytes: int = 512 * 1024 * 1024):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        # Unique per writer, so parallel workers never write to the same shard.
+        self.prefix = prefix or f"shard-{int(time.time())}-{os.getpid()}"
+        self.max_shard_bytes = max_shard_bytes
+        self.shard_count = 0
+        self._tar: Optional[tarfile.TarFile] = None
+        self._shard_name = ""
+        self._index = open(os.path.join(out_dir, f"{self.prefix}.index.jsonl"), "a", encoding="utf-8")
+
+    def _open_next_shard(self) -> None:
+        if self._tar is not None:
+            self._tar.close()
+        self._shard_name = f"{self.prefix}-{self.shard_count:06d}.tar"
+        self._tar = tarfile.open(os.path.join(self.out_dir, self._shard_name), "w", format=tarfile.USTAR_FORMAT)
+        self.shard_count += 1
+
+    def write(self, key: str, members: dict[str, bytes]) -> None:
+        """Append one sample; `members` maps an extension (e.g. "png") to the member's bytes"""
+        if self._tar is None or self._tar.offset >= self.max_shard_bytes:
+            self._open_next_shard()
+
+        offsets = {}
+        mtime = time.time()
+        for ext, data in members.items():
+            info = tarfile.TarInfo(f"{key}.{ext}")
+            info.size = len(data)
+            info.mtime = mtime
+            self._tar.addfile(info, io.BytesIO(data))
+            # The data ends at the current offset, padded to whole tar blocks.
+            padded = (len(data) + TAR_BLOCK - 1) // TAR_BLOCK * TAR_BLOCK
+            offsets[ext] = [self._tar.offset - padded, len(data)]
+            # The member list is only needed for reading; don't let it grow with the shard.
+            self._tar.members.clear()
+
+        # The members reach the file before the index line that points at them.
+        self._tar.fileobj.flush()
+        self._index.write(json.dumps({"key": key, "shard": self._shard_name, "members": offsets}) + "\n")
+        self._index.flush()
+
+    def close(self) -> None:
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        if not self._index.closed:
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardReader:
+    """Random and sequential access to the shards (and indexes) in a directory"""
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        self.index: dict[str, dict] = {}
+        for index_path in sorted(glob.glob(os.path.join(shard_dir, "*.index.jsonl"))):
+            with open(index_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.index[entry["key"]] = entry
+
+    def keys(self) -> list[str]:
+        return list(self.index)
+
+    def read(self, key: str, ext: str) -> bytes:
+        """Read one member of one sample by seeking straight to it"""
+        entry = self.index[key]
+        offset, size = entry["members"][ext]
+        with open(os.path.join(self.shard_dir, entry["shard"]), "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def __iter__(self) -> Iterator[tuple[str, dict[str, bytes]]]:
+        """Yield (key, members) for every sample, reading each shard sequentially"""
+        for shard_path in sorted(glob.glob(os.path.join(self.shard_dir, "*.tar"))):
+            key, members = None, {}
+            with tarfile.open(shard_path, "r") as tar:
+                for info in tar:
+                    sample_key, ext = info.name.rsplit(".", 1)
+                    if sample_key != key and members:
+                        yield key, members
+                        members = {}
+                    key = sample_key
+                    members[ext] = tar.extractfile(info).read()
+            if members:
+                yield key, members
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Optional
+from PIL import Image, ImageDraw
+from PIL.ImageFont import FreeTypeFont
+import dotenv
+import os
+
+from helper.glyph_metrics import get_bbox
+
+
+dotenv.load_dotenv()
+
+SPRITE_CACHE_MAX_BYTES = int(os.getenv("SPRITE_CACHE_MAX_BYTES", default=128 * 1024 * 1024))
+
+
+class SpriteCache:
+    """
+    LRU cache (bounded by bytes) of rasterized word alpha masks keyed by
+    (font path, size, word). Drawing a cached word is a single masked
+    paste of the text color, which gives the same pixels as `draw.text`.
+    Keys only repeat often with a small vocabulary or a fixed font and size;
+    with random fonts, sizes and dictionary words nearly every lookup misses.
+    """
+
+    def __init__(self, max_bytes: int = SPRITE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._sprites: OrderedDict[tuple[str, int, str], Optional[Image.Image]] = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_sprite(self, font: FreeTypeFont, word: str) -> Optional[Image.Image]:
+        """Return the "L" mask of `word` spanning its bbox, or None if it has no pixels"""
+        key = (font.path, font.size, word)
+        if key in self._sprites:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return self._sprites[key]
+
+        self.misses += 1
+        left, top, right, bottom = get_bbox(font, word)
+        sprite = None
+        if right > left and bottom > top:
+            sprite = Image.new("L", (right - left, bottom - top), 0)
+            ImageDraw.Draw(sprite).text((-left, -top), word, font=font, fill=255)
+            self.current_bytes += sprite.width * sprite.height
+
+        self._sprites[key] = sprite
+        while len(self._sprites) > 1 and self.current_bytes > self.max_bytes:
+            _, old = self._sprites.popitem(last=False)
+            if old is not None:
+                self.current_bytes -= old.width * old.height
+            self.evictions += 1
+        return sprite
+
+    def draw_text(self, bg: Image.Image, xy: tuple[int, int], word: str, font: FreeTypeFont, fill) -> None:
+        """Composite `word` onto `bg` at `xy` (same anchor as `ImageDraw.text`)"""
+        sprite = self.get_sprite(font, word)
+        if sprite is None:
+            return
+        left, top, _, _ = get_bbox(font, word)
+        x, y = xy[0] + left, xy[1] + top
+        bg.paste(fill, (x, y, x + sprite.width, y + sprite.height), sprite)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._sprites),
+            "bytes": self.current_bytes,
+        }
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+
+# Process-wide cache used when TEXT_RENDER_MODE=sprite.
+SPRITE_CACHE = SpriteCache()
@@ -1,14 +1,35 @@
-def read_text_file(file_path: str) -> list[str]:
+from collections.abc import Sequence
+from typing import Union
+import numpy as np
+from helper.corpus import Corpus, is_corpus_file
+
+# One YOLO label line: class, then x_center, y_center, width, height
+_LABEL_LINE = "%d %.6f %.6f %.6f %.6f\n"
+
+
+def read_text_file(file_path: str) -> Sequence[str]:
+    """Read one word per line, or map a corpus file built by helper/corpus.py."""
+    if is_corpus_file(file_path):
+        return Corpus(file_path)
     with open(file_path, "r", encoding='utf-8') as f:
         return f.read().splitlines()
 
 
-def save_label(bbox: list[tuple[int, float, float, float, float]], filename: str) -> None:
+def format_label(bbox: Union[list[tuple[int, float, float, float, float]], np.ndarray]) -> str:
+    """
+    Format YOLO boxes (a list of tuples, or an (N, 5) array from
+    `convert_to_yolo_array`) as the contents of a label file.
+    """
+    if isinstance(bbox, np.ndarray):
+        # A single %-format over all values instead of one format per box
+        return (_LABEL_LINE * len(bbox)) % tuple(bbox.ravel().tolist())
+    return "".join(f"{b[0]} {b[1]:.6f} {b[2]:.6f} {b[3]:.6f} {b[4]:.6f}\n" for b in bbox)
+
+
+def save_label(bbox: Union[list[tuple[int, float, float, float, float]], np.ndarray], filename: str) -> None:
     """Save the label to the specified filename."""
     with open(filename, 'w') as f:
-        for b in bbox:
-            entry = f"{b[0]} {b[1]:.6f} {b[2]:.6f} {b[3]:.6f} {b[4]:.6f}\n"
-            f.write(entry)
+        f.write(format_label(bbox))
 
 
 def save_xml_label(xml_content: str, xml_filename: str) -> None:
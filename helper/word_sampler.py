@@ -0,0 +1,41 @@
+from collections.abc import Sequence
+from typing import Iterator
+import random
+
+from helper.khnormal import khnormal_word
+from helper.profiling import stage
+
+
+class WordSampler:
+    """
+    Lazy, page-bounded source of words for one page.
+
+    Yields up to `limit` random words from `words`, normalizing each one
+    only when it is pulled. The layout pulls one word at a time and stops
+    at the first one that doesn't fit, so `sampled` exceeds the number of
+    drawn words by at most one. Words are drawn from `rng` (see helper/rng.py).
+    """
+
+    def __init__(self, words: Sequence[str], limit: int, normalized: bool = False, rng=random):
+        self.rng = rng
+        self.words = words
+        self.limit = limit
+        self.normalized = normalized
+        self.sampled = 0
+
+    def __iter__(self) -> Iterator[str]:
+        for _ in range(self.limit):
+            word = self.rng.choice(self.words)
+            if not self.normalized:
+                with stage("khnormal"):
+                    word = khnormal_word(word)
+            self.sampled += 1
+            yield word
+
+    def stats(self, drawn: int) -> dict:
+        """Return sampled/drawn/discarded word counts for the page"""
+        return {
+            "words_sampled": self.sampled,
+            "words_drawn": drawn,
+            "words_discarded": self.sampled - drawn,
+        }
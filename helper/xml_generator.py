@@ -2,10 +2,30 @@
 import xml.etree.ElementTree as ET
 from typing import List, Tuple
 
+XML_DECLARATION = "<?xml version='1.0' encoding='utf-8'?>\n"
+
+
+def _escape_text(text: str) -> str:
+    """Escape element text the way ElementTree does (&, < and >)."""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _leaf(tag: str, text: str) -> str:
+    # ElementTree writes an element without text as a short empty element
+    return f"<{tag}>{text}</{tag}>" if text else f"<{tag} />"
+
+
 def generate_xml_content(
-    lines: List[List[Tuple[str, Tuple]]], 
-    image_filename: str, 
-    image_size: Tuple[int, int]
+    lines: List[List[Tuple[str, Tuple]]],
+    image_filename: str,
+    image_size: Tuple[int, int],
+    pretty: bool = True
 ) -> str:
     """
     Generate XML content in the specified format
@@ -13,27 +33,79 @@ def generate_xml_content(
         lines: List of lines containing word tuples (text, (x, y, w, h))
         image_filename: Name of the image file
         image_size: Tuple of (width, height)
+        pretty: Indent with two spaces per level (same output as
+            `generate_xml_content_etree`); otherwise no whitespace
+            between elements
+    The document is written straight into a list of strings, without
+    building an element tree.
+    """
+    if pretty:
+        nl1, nl2, nl3, nl4 = "\n  ", "\n    ", "\n      ", "\n        "
+        nl0 = "\n"
+    else:
+        nl0 = nl1 = nl2 = nl3 = nl4 = ""
+
+    out = [
+        XML_DECLARATION,
+        "<metadata>", nl1,
+        _leaf("image", _escape_text(image_filename)), nl1,
+        _leaf("width", str(image_size[0])), nl1,
+        _leaf("height", str(image_size[1])), nl1,
+    ]
+
+    if not lines:
+        out.append("<paragraph />")
+    else:
+        out.append("<paragraph>")
+        for line_id, line in enumerate(lines, 1):
+            out.append(nl2)
+            if not line:
+                out.append(f'<line id="{line_id}" />')
+                continue
+            out.append(f'<line id="{line_id}">')
+            for word_text, (x1, y1, w, h) in line:
+                out += (
+                    nl3, "<word>", nl4,
+                    _leaf("text", _escape_text(word_text)), nl4,
+                    f'<bbox x1="{round(x1)}" y1="{round(y1)}" x2="{round(x1 + w)}" y2="{round(y1 + h)}" />', nl3,
+                    "</word>",
+                )
+            out += (nl2, "</line>")
+        out += (nl1, "</paragraph>")
+
+    out += (nl0, "</metadata>")
+    return "".join(out)
+
+
+def generate_xml_content_etree(
+    lines: List[List[Tuple[str, Tuple]]],
+    image_filename: str,
+    image_size: Tuple[int, int]
+) -> str:
+    """
+    Reference implementation of `generate_xml_content` (pretty) built
+    with ElementTree; kept for comparisons and benchmarks.
     """
     root = ET.Element("metadata")
-    
+
     # Image info
     ET.SubElement(root, "image").text = image_filename
     ET.SubElement(root, "width").text = str(image_size[0])
     ET.SubElement(root, "height").text = str(image_size[1])
-    
+
     # Main paragraph container
     paragraph = ET.SubElement(root, "paragraph")
-    
+
     # Add lines with words
     for line_id, line in enumerate(lines, 1):
         line_elem = ET.SubElement(paragraph, "line", id=str(line_id))
-        
+
         for word_idx, (word_text, bbox) in enumerate(line):
             word_elem = ET.SubElement(line_elem, "word")
-            
+
             # Word text
             ET.SubElement(word_elem, "text").text = word_text
-            
+
             # Bounding box coordinates
             x1, y1, w, h = bbox
             bbox_elem = ET.SubElement(word_elem, "bbox")
@@ -41,8 +113,8 @@ def generate_xml_content(
             bbox_elem.set("y1", str(round(y1)))
             bbox_elem.set("x2", str(round(x1 + w)))
             bbox_elem.set("y2", str(round(y1 + h)))
-    
+
     # Format XML
     ET.indent(root, space="  ")
     xml_str = ET.tostring(root, encoding='utf-8', method='xml').decode()
-    return f"<?xml version='1.0' encoding='utf-8'?>\n{xml_str}"
\ No newline at end of file
+    return f"<?xml version='1.0' encoding='utf-8'?>\n{xml_str}"
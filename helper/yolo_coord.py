@@ -1,3 +1,8 @@
+import numpy as np
+
+# Column layout of the YOLO label arrays: class, x_center, y_center, width, height (normalized)
+YOLO_COLUMNS = 5
+
 
 def convert_to_yolo_format(annotations: list[tuple[float, float, float, float]], orig_w: int, orig_h: int, target_size: tuple[int, int]) -> list[tuple[int, float, float, float, float]]:
     """Convert coordinates to YOLO format"""
@@ -23,6 +28,36 @@ def convert_to_yolo_format(annotations: list[tuple[float, float, float, float]],
     return yolo_annotations
 
 
+def convert_to_yolo_array(annotations: list[tuple[float, float, float, float]], orig_w: int, orig_h: int, target_size: tuple[int, int]) -> np.ndarray:
+    """
+    Vectorized `convert_to_yolo_format`: converts all (x, y, w, h) boxes at
+    once into an (N, 5) float64 array with the same values, row by row.
+    """
+    boxes = np.asarray(annotations, dtype=np.float64).reshape(-1, 4)
+    target_w, target_h = target_size
+
+    # Scale coordinates
+    x = boxes[:, 0] * (target_w / orig_w)
+    y = boxes[:, 1] * (target_h / orig_h)
+    w = boxes[:, 2] * (target_w / orig_w)
+    h = boxes[:, 3] * (target_h / orig_h)
+
+    # Clamp to image boundaries (same order as clamp_coordinates)
+    x = np.maximum(0, np.minimum(x, target_w - 1))
+    y = np.maximum(0, np.minimum(y, target_h - 1))
+    w = np.maximum(1, np.minimum(w, target_w - x))
+    h = np.maximum(1, np.minimum(h, target_h - y))
+
+    # Convert to YOLO format
+    yolo = np.empty((len(boxes), YOLO_COLUMNS), dtype=np.float64)
+    yolo[:, 0] = 0
+    yolo[:, 1] = (x + w / 2) / target_w
+    yolo[:, 2] = (y + h / 2) / target_h
+    yolo[:, 3] = w / target_w
+    yolo[:, 4] = h / target_h
+    return yolo
+
+
 def clamp_coordinates(x: float, y: float, w: float, h: float, target_size: tuple[int, int]) -> tuple[float, float, float, float]:
     """Ensure coordinates stay within image bounds"""
     x = max(0, min(x, target_size[0] - 1))
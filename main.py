@@ -2,13 +2,24 @@ import os
 import sys
 import random
 import dotenv
-from PIL import ImageDraw, ImageFont, Image
-from helper.image_processing import apply_artifact, rand_brightness_contrast, apply_motion_blur, apply_color_jitter
+from typing import Iterable, Optional
+from PIL import ImageDraw, Image
+from helper.image_processing import AugmentationPipeline
 from helper.get_color import get_contrast_color
+from helper.layout import layout_words
+from helper.word_sampler import WordSampler
+from helper.sprite_cache import SPRITE_CACHE
+from helper.background_pool import BackgroundPool, load_background_pool
 from helper.get_random import get_random_background, get_random_font, get_random_img_padding, get_random_line_spacing, get_random_word_padding, get_random_font_size
-from helper.yolo_coord import convert_to_yolo_format
-from helper.utils import read_text_file, save_label, save_xml_label
+from helper.yolo_coord import convert_to_yolo_array
+from helper.utils import read_text_file, format_label
+from helper.output_sinks import AsyncSink, OutputSink, Sample, open_sink
+from helper.image_encoder import ImageEncoder
+from helper.sample_index import open_sample_index
+from helper.rng import sample_rng
+from helper.progress_manifest import sample_key
 from helper.xml_generator import generate_xml_content
+from helper.profiling import stage, is_enabled as profiling_enabled, snapshot as profile_snapshot, format_table
 # from helper.khmer_text_sorter import sort_text2sub
 from helper.khnormal import khnormal, testsyl
 
@@ -32,8 +43,36 @@ FONT_DIR = os.getenv("FONT_DIR", "fonts/")
 SAVE_DIR = os.getenv("SAVE_DIR", "synthetic_images/")
 LABEL_DIR = os.getenv("LABEL_DIR", "synthetic_labels/")
 XML_DIR = os.getenv("XML_DIR", "synthetic_xml_labels/")
+# Append-only record of every sample written to the output (with a checksum), for generator.py --resume; empty disables it
+PROGRESS_MANIFEST = os.getenv("PROGRESS_MANIFEST", "synthetic_manifest.jsonl")
+# Metadata of every generated sample (image, size, boxes, fonts), one JSON line each; empty disables it
+SAMPLE_INDEX_FILE = os.getenv("SAMPLE_INDEX_FILE", "synthetic_index.jsonl")
+# Indent the XML labels (false writes them without whitespace between elements)
+XML_PRETTY = os.getenv("XML_PRETTY", "true").lower() in ("1", "true", "yes")
+
+# OUTPUT ("files": one png/txt/xml file per sample, "tar": samples streamed into tar shards in SHARD_DIR,
+# "kv": all samples in the SQLite file KV_PATH, "null": discard everything, for benchmarking)
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "files")
+SHARD_DIR = os.getenv("SHARD_DIR", "synthetic_shards/")
+SHARD_MAX_BYTES = int(os.getenv("SHARD_MAX_BYTES", 512 * 1024 * 1024))
+KV_PATH = os.getenv("KV_PATH", "synthetic_samples.db")
+# Background threads encoding and writing samples (0 writes synchronously), and how many samples may wait for them
+OUTPUT_WRITER_THREADS = int(os.getenv("OUTPUT_WRITER_THREADS", 2))
+OUTPUT_QUEUE_SIZE = int(os.getenv("OUTPUT_QUEUE_SIZE", 16))
+
+# IMAGE ENCODING ("png", "jpeg" or "webp"; compress level 0-9 for png, quality 1-100 for jpeg/webp)
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "png")
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", 6))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 90))
+# Store the artifact's JPEG bytes (as .jpg) when no later augmentation changed the pixels
+REUSE_ARTIFACT_JPEG = os.getenv("REUSE_ARTIFACT_JPEG", "false").lower() in ("1", "true", "yes")
 BACKGROUND_IMAGES_DIR = os.getenv("BACKGROUND_IMAGES_DIR", "background/")
 
+# BACKGROUND POOL (decoded once, memory-mapped and shared by all workers; empty disables it)
+BACKGROUND_POOL_DIR = os.getenv("BACKGROUND_POOL_DIR", "")
+background_scale_buckets_str = os.getenv("BACKGROUND_SCALE_BUCKETS", "")
+BACKGROUND_SCALE_BUCKETS = tuple(map(float, filter(None, background_scale_buckets_str.split(','))))
+
 # FONT SIZE
 MIN_FONT_SIZE = int(os.getenv("MIN_FONT_SIZE", 20))
 MAX_FONT_SIZE = int(os.getenv("MAX_FONT_SIZE", 100))
@@ -53,6 +92,8 @@ MAX_WORD_PADDING = int(os.getenv("MAX_WORD_PADDING", 10))
 # TEXT FILE
 TEXT_FILE = os.getenv("TEXT_FILE", "Khmer Dictionary 2022.txt")
 TEXT_WORDS = read_text_file(TEXT_FILE)
+# A corpus built with `python3 -m helper.corpus` is already normalized
+TEXT_NORMALIZED = getattr(TEXT_WORDS, "normalized", False)
 
 # PARAGRAPH LENGTH
 MIN_PARAG_LENGTH = int(os.getenv("MIN_PARAG_LENGTH", 1))
@@ -111,23 +152,72 @@ NEW_X_RANGE = new_x_range_list[0], new_x_range_list[1]
 
 POSSIBILITIES_FOR_NEW_COLOR = float(os.getenv("POSSIBILITIES_FOR_NEW_COLOR", 0.005))
 
-# === END CONFIGURATION ===
+# RANDOMNESS (with a SEED, sample i is drawn from its own stream seeded by (SEED, i) and is reproducible; empty = unseeded)
+seed_str = os.getenv("SEED", "")
+SEED = int(seed_str) if seed_str else None
+if SEED is not None and SEED < 0:
+    raise ValueError(f"SEED must be a non-negative integer, got {SEED}")
 
+# TEXT RENDERING ("draw": rasterize every word, "sprite": composite cached word masks)
+TEXT_RENDER_MODES = ("draw", "sprite")
+TEXT_RENDER_MODE = os.getenv("TEXT_RENDER_MODE", "draw")
+if TEXT_RENDER_MODE not in TEXT_RENDER_MODES:
+    raise ValueError(f"Unknown TEXT_RENDER_MODE: {TEXT_RENDER_MODE!r} (expected one of {', '.join(TEXT_RENDER_MODES)})")
 
-def create_text_image_with_bbox() -> tuple[Image.Image, list[list[tuple[str, tuple[float, float, float, float]]]], list[tuple[float, float, float, float]]]:
-    """Create an image with text and bounding boxes"""
+# TEXT COLOR ("page": one color from the whole background, "line"/"word": from the region under each line/word)
+TEXT_COLOR_MODES = ("page", "line", "word")
+TEXT_COLOR_MODE = os.getenv("TEXT_COLOR_MODE", "page")
+if TEXT_COLOR_MODE not in TEXT_COLOR_MODES:
+    raise ValueError(f"Unknown TEXT_COLOR_MODE: {TEXT_COLOR_MODE!r} (expected one of {', '.join(TEXT_COLOR_MODES)})")
+
+# === END CONFIGURATION ===
+
+AUGMENTATION = AugmentationPipeline(
+    artifact_possibility=ARTIFACT_POSSIBILITIES,
+    jpeg_compression_range=JPEG_COMPRESSION_RANGE,
+    motion_blur_possibility=MOTION_BLUR_POSSIBILITIES,
+    motion_blur_kernel_size_range=MOTION_BLUR_KERNEL_SIZE_RANGE,
+    alpha_range=ALPHA_RANGE,
+    beta_range=BETA_RANGE,
+    color_jitter_possibility=COLOR_JITTER_POSSIBILITES,
+    hue_delta=HUE_DELTA,
+    sat_scale=SAT_SCALE,
+    val_scale=VAL_SCALE,
+    # Reusing the artifact's JPEG bytes needs the artifact to be the last op that changes pixels
+    artifact_last=REUSE_ARTIFACT_JPEG,
+)
+
+IMAGE_ENCODER = ImageEncoder(IMAGE_FORMAT, PNG_COMPRESS_LEVEL, IMAGE_QUALITY, reuse_jpeg=REUSE_ARTIFACT_JPEG)
+
+# Opened on the first background, see get_background_pool()
+_background_pool: Optional[BackgroundPool] = None
+_background_pool_checked = False
+# Opened on the first sample, see get_output_sink()
+_output_sink: Optional[OutputSink] = None
+# Stored and failed samples not yet handed out by collect_writes()
+_written_keys: list[str] = []
+_failed_writes: list[tuple[str, BaseException]] = []
+
+
+def create_text_image_with_bbox(stats: Optional[dict] = None, rng=random) -> tuple[Image.Image, list[list[tuple[str, tuple[float, float, float, float]]]], list[tuple[float, float, float, float]]]:
+    """
+    Create an image with text and bounding boxes.
+    If `stats` is given, it is filled with how many words were
+    sampled, drawn and discarded for this page, and the fonts used.
+    All random draws come from `rng` (see helper/rng.py).
+    """
 
-    text_len = random.randint(MIN_PARAG_LENGTH, MAX_PARAG_LENGTH)
-    texts = random.choices(TEXT_WORDS, k=text_len)
+    text_len = rng.randint(MIN_PARAG_LENGTH, MAX_PARAG_LENGTH)
+    # Words are sampled (and normalized) on demand; sampling stops when the page is full
+    texts = WordSampler(TEXT_WORDS, text_len, normalized=TEXT_NORMALIZED, rng=rng)
     # wordlist_len = len(TEXT_WORDS)
     # texts = TEXT_WORDS[(start := random.randint(0, wordlist_len - text_len)) : start + text_len]
-
-    texts = ["".join(khnormal(text)) for text in texts] # normalize words
     
     # texts = khnormal("".join(texts)) # normalized text in subsyllables
     # texts = testsyl("".join(texts))  # segment texts into subsyllables
 
-    bg = get_random_background(IMAGE_SIZE, BACKGROUND_IMAGES_DIR, MIN_IMG_SCALE, MAX_IMG_SCALE)
+    with stage("background"):
+        bg = get_random_background(IMAGE_SIZE, BACKGROUND_IMAGES_DIR, MIN_IMG_SCALE, MAX_IMG_SCALE, pool=get_background_pool(), rng=rng)
 
     drawn_image, lines, annotations = draw_texts_on_image(
         bg,
@@ -151,14 +241,21 @@ def create_text_image_with_bbox() -> tuple[Image.Image, list[list[tuple[str, tup
         POSSIBILITIES_FOR_NEW_X, NEW_X_RANGE,
         POSSIBILITIES_FOR_NEW_COLOR,
         BBOX_WIDTH_PADDING, BBOX_HEIGHT_PADDING,
+        render_mode=TEXT_RENDER_MODE,
+        color_mode=TEXT_COLOR_MODE,
+        stats=stats,
+        rng=rng,
     )
 
+    if stats is not None:
+        stats.update(texts.stats(drawn=len(annotations)))
+
     return drawn_image, lines, annotations
 
 
 def draw_texts_on_image(
     bg: Image.Image,
-    texts: list[str],
+    texts: Iterable[str],
     font_dir: str,
     min_img_padding: int,
     max_img_padding: int,
@@ -177,76 +274,92 @@ def draw_texts_on_image(
     possibilities_for_new_x: float, new_x_range: tuple[int, int],
     possibilities_for_new_color: float,
     bbox_width_padding: int, bbox_height_padding: int,
+    render_mode: str = "draw",
+    color_mode: str = "page",
+    stats: Optional[dict] = None,
+    rng=random,
 ) -> tuple[Image.Image, list[list[tuple[str, tuple[float, float, float, float]]]], list[tuple[float, float, float, float]]]:
     """
-    Draws a list of words onto `bg`, flowing them in lines
+    Draws words from `texts` onto `bg`, flowing them in lines
     with fixed `font_size`. Returns the annotated image
     plus a list of (x, y, w, h) for each drawn word.
+    The layout is computed first (see helper/layout.py) and only the
+    words that fit are drawn; `texts` may be a lazy iterator.
+    With `render_mode="sprite"` words are composited from the sprite
+    cache instead of rasterized; pixels and boxes are the same.
+    `color_mode` picks the text color from the whole page ("page"),
+    or from the background under each line ("line") or word ("word").
+    If `stats` is given, its "fonts" entry receives the file names of
+    the fonts of the drawn words. All random draws come from `rng`.
     """
 
-    x_padding, y_padding = get_random_img_padding(min_img_padding=min_img_padding, max_img_padding=max_img_padding)
-    line_spacing = get_random_line_spacing(min_line_spacing=min_line_spacing, max_line_spacing=max_line_spacing)
-    font_size = get_random_font_size(min_font_size=min_font_size, max_font_size=max_font_size)
-    word_padding = get_random_word_padding(min_word_padding=min_word_padding, max_word_padding=max_word_padding)
+    x_padding, y_padding = get_random_img_padding(min_img_padding=min_img_padding, max_img_padding=max_img_padding, rng=rng)
+    line_spacing = get_random_line_spacing(min_line_spacing=min_line_spacing, max_line_spacing=max_line_spacing, rng=rng)
+    font_size = get_random_font_size(min_font_size=min_font_size, max_font_size=max_font_size, rng=rng)
+    word_padding = get_random_word_padding(min_word_padding=min_word_padding, max_word_padding=max_word_padding, rng=rng)
 
-    # Pick one font file at random, and load it once at `font_size`.
-    chosen_font_path = get_random_font(font_dir)
-    font = ImageFont.truetype(chosen_font_path, font_size)
-    
-    draw = ImageDraw.Draw(bg)
-    annotations = []
-    current_line = []
-    lines = []
-
-    current_x = x_padding
-    current_y = y_padding
-    max_line_height = 0
+    # Pick one font file at random
+    chosen_font_path = get_random_font(font_dir, rng)
 
     # Pick a text color that contrasts with the background
-    text_color = get_contrast_color(bg, 0, 0, bg.width, bg.height)
+    text_color = get_contrast_color(bg, 0, 0, bg.width, bg.height, rng=rng)
     
-    if random.random() < possibilities_for_new_font_size:
-        font_size = get_random_font_size(min_font_size=min_font_size, max_font_size=max_font_size)
-        font = ImageFont.truetype(chosen_font_path, font_size)
-
-    for word in texts:
-        if random.random() < possibilities_for_new_padding:
-            x_padding, y_padding = get_random_img_padding(min_img_padding=min_img_padding, max_img_padding=max_img_padding)
-        if random.random() < possibilities_for_new_line_spacing:
-            line_spacing = get_random_line_spacing(min_line_spacing=min_line_spacing, max_line_spacing=max_line_spacing)
-        if random.random() < possibilities_for_new_font:
-            chosen_font_path = get_random_font(font_dir)
-            font = ImageFont.truetype(chosen_font_path, font_size)
-        if random.random() < possibilities_for_new_word_padding:
-            word_padding = get_random_word_padding(min_word_padding=min_word_padding, max_word_padding=max_word_padding)
-        if random.random() < possibilities_for_new_y:
-            current_y += random.randint(*new_y_range)
-        if random.random() < possibilities_for_new_x:
-            current_x += random.randint(*new_x_range)
-        if random.random() < possibilities_for_new_color:
-            text_color = get_contrast_color(bg, 0, 0, bg.width, bg.height)
-
-        # Measure this word
-        # print(word)
-        bbox = font.getbbox(word)
-        left, top, right, bottom = bbox  # Unpack the bbox values
+    if rng.random() < possibilities_for_new_font_size:
+        font_size = get_random_font_size(min_font_size=min_font_size, max_font_size=max_font_size, rng=rng)
+
+    # Phase one: decide where every word goes, pulling only as many words as fit on the page
+    # (the "layout" stage includes sampling and normalizing the words and measuring them)
+    with stage("layout"):
+        layout = layout_words(
+            texts, bg.size, font_dir, chosen_font_path, font_size,
+            x_padding, y_padding, line_spacing, word_padding,
+            min_img_padding, max_img_padding,
+            min_line_spacing, max_line_spacing,
+            min_word_padding, max_word_padding,
+            possibilities_for_new_padding,
+            possibilities_for_new_line_spacing,
+            possibilities_for_new_word_padding,
+            possibilities_for_new_font,
+            possibilities_for_new_y, new_y_range,
+            possibilities_for_new_x, new_x_range,
+            possibilities_for_new_color,
+            rng=rng,
+        )
+
+    # Phase two: draw only the placed words
+    draw = ImageDraw.Draw(bg)
+    annotations = []
+    lines = [[] for _ in layout.lines]
+
+    if color_mode == "line":
+        # One color per line, picked from the background under the whole line
+        line_colors = []
+        for line in layout.lines:
+            line_placements = [layout.placements[i] for i in line]
+            x0 = min(p.x + p.bbox[0] for p in line_placements)
+            y0 = min(p.y + p.bbox[1] for p in line_placements)
+            x1 = max(p.x + p.bbox[2] for p in line_placements)
+            y1 = max(p.y + p.bbox[3] for p in line_placements)
+            line_colors.append(get_contrast_color(bg, x0, y0, x1 - x0, y1 - y0, rng=rng))
+
+    for placement in layout.placements:
+        word, current_x, current_y, font = placement.word, placement.x, placement.y, placement.font
+        left, top, right, bottom = placement.bbox
         text_width = right - left
         text_height = bottom - top
 
-        # If it doesn’t fit on this line, wrap to next
-        if current_x + (text_width + word_padding) > (bg.width - x_padding):
-            if current_line:
-                lines.append(current_line)
-                current_line = []        # Save XML content
-            current_x = x_padding
-            current_y += max_line_height + line_spacing
-            max_line_height = 0
-
-        # If no more vertical space, stop early
-        if current_y + (top + text_height) > (bg.height - y_padding):  # Adjust with top offset
-            break
-
-        draw.text((current_x, current_y), word, font=font, fill=text_color)
+        if color_mode == "word":
+            text_color = get_contrast_color(bg, current_x + left, current_y + top, text_width, text_height, rng=rng)
+        elif color_mode == "line":
+            text_color = line_colors[placement.line]
+        elif placement.new_color:
+            text_color = get_contrast_color(bg, 0, 0, bg.width, bg.height, rng=rng)
+
+        with stage("draw_text"):
+            if render_mode == "sprite":
+                SPRITE_CACHE.draw_text(bg, (current_x, current_y), word, font, text_color)
+            else:
+                draw.text((current_x, current_y), word, font=font, fill=text_color)
         
         # Calculate padded bounding box
         x = current_x + left - bbox_width_padding  # Expand left
@@ -255,59 +368,171 @@ def draw_texts_on_image(
         text_height_padded = text_height + 2 * bbox_height_padding
 
         word_info = (word, (x, y, text_width_padded, text_height_padded))
-        current_line.append(word_info)
+        lines[placement.line].append(word_info)
         annotations.append((x, y, text_width_padded, text_height_padded))
 
-        # Advance the cursor with the full width (including right)
-        current_x += (right - left) + word_padding  # Use right - left instead of text_width for consistency
-        max_line_height = max(max_line_height, (bottom - top))  # Use actual height
-
-    if current_line:
-        lines.append(current_line)
+    if stats is not None:
+        stats["fonts"] = sorted({os.path.basename(p.font.path) for p in layout.placements})
 
     return bg, lines, annotations
 
 
 
-if __name__ == "__main__":
-    sys.argv = sys.argv[1:]
+def generate_sample(index: int, stats: Optional[dict] = None, rng=None) -> str:
+    """
+    Render, augment and save the sample with the given index. Returns the image filename.
+    `stats` (if given) receives the per-page word counts and fonts of
+    `create_text_image_with_bbox`, plus the sample's metadata for the
+    sample index (image, width, height, boxes).
+    Random draws come from `rng`; by default that is the sample's own
+    stream when SEED is set (so the sample can be regenerated alone),
+    else the global `random` module.
+    """
+    if rng is None:
+        rng = sample_rng(SEED, index) if SEED is not None else random
 
-    _from = int(sys.argv[0])
-    _to = int(sys.argv[1])
-    _step = int(sys.argv[2])
+    with stage("render"):
+        img, lines, bbox = create_text_image_with_bbox(stats, rng)
 
-    for i in range(_from, _to, _step):
-        img, lines, bbox = create_text_image_with_bbox()
+    # Artifact, motion blur, brightness/contrast and color jitter in a single pass
+    with stage("augment"):
+        img, jpeg = AUGMENTATION.run(img, rng)
 
-        img = apply_artifact(img, posssibility=ARTIFACT_POSSIBILITIES,
-                             possible_compression=JPEG_COMPRESSION_RANGE)
-        img = apply_motion_blur(img, posssibility=MOTION_BLUR_POSSIBILITIES,
-                                possible_size=MOTION_BLUR_KERNEL_SIZE_RANGE)
-        img = rand_brightness_contrast(
-            img, alpha_range=ALPHA_RANGE, beta_range=BETA_RANGE)
+    with stage("yolo"):
+        bbox = convert_to_yolo_array(bbox, img.width, img.height, IMAGE_SIZE)
+        label = format_label(bbox)
 
-        img = apply_color_jitter(img, possibility=COLOR_JITTER_POSSIBILITES, 
-                                 hue_delta=HUE_DELTA, sat_scale=SAT_SCALE, val_scale=VAL_SCALE)
+    key = sample_key(index)
+    image_filename = f"{key}.{IMAGE_ENCODER.extension(jpeg)}"
+    with stage("xml"):
+        xml_content = generate_xml_content(
+            lines=lines,
+            image_filename=image_filename,
+            image_size=img.size,
+            pretty=XML_PRETTY
+        )
 
-        bbox = convert_to_yolo_format(bbox, img.width, img.height, IMAGE_SIZE)
-        
-        os.makedirs(SAVE_DIR, exist_ok=True)
-        os.makedirs(LABEL_DIR, exist_ok=True)
-        os.makedirs(XML_DIR, exist_ok=True)
+    # Encoding and writing happen on the sink's writer threads
+    with stage("output"):
+        sink = get_output_sink()
+        sink.write(Sample(key, img, label, xml_content, jpeg))
+        if not isinstance(sink, AsyncSink):
+            _written_keys.append(key)  # stored before write returned
 
-        image_filename = f"img_{i:05d}.png"
-        img.save(os.path.join(SAVE_DIR, image_filename))
+    if stats is not None:
+        stats.update(image=image_filename, width=img.width, height=img.height, boxes=len(bbox))
 
-        label_filename = f"img_{i:05d}.txt"
-        save_label(bbox, os.path.join(LABEL_DIR, label_filename))
+    return image_filename
 
-        xml_content = generate_xml_content(
-            lines=lines,
-            image_filename=image_filename,
-            image_size=img.size
+
+def get_background_pool() -> Optional[BackgroundPool]:
+    """
+    Get the shared background pool, opening it on first use.
+    The pool is never built here (generator.py or `python3 -m helper.background_pool`
+    build it); if it is missing or stale, backgrounds are decoded from disk.
+    """
+    global _background_pool, _background_pool_checked
+    if not _background_pool_checked:
+        _background_pool_checked = True
+        if BACKGROUND_POOL_DIR and BACKGROUND_IMAGES_DIR:
+            _background_pool = load_background_pool(BACKGROUND_IMAGES_DIR, BACKGROUND_POOL_DIR, IMAGE_SIZE, BACKGROUND_SCALE_BUCKETS)
+            if _background_pool is None:
+                print(f"Warning: background pool in '{BACKGROUND_POOL_DIR}' is missing or out of date, decoding backgrounds from disk "
+                      "(build it with `python3 -m helper.background_pool`)", file=sys.stderr)
+    return _background_pool
+
+
+def get_output_sink() -> OutputSink:
+    """Get the output sink for OUTPUT_FORMAT, opening it on first use."""
+    global _output_sink
+    if _output_sink is None:
+        _output_sink = open_sink(
+            OUTPUT_FORMAT,
+            SAVE_DIR, LABEL_DIR, XML_DIR,
+            SHARD_DIR, SHARD_MAX_BYTES,
+            KV_PATH,
+            IMAGE_ENCODER,
+            writer_threads=OUTPUT_WRITER_THREADS, queue_size=OUTPUT_QUEUE_SIZE,
+            manifest_path=PROGRESS_MANIFEST,
         )
+    return _output_sink
+
+
+def close_outputs() -> None:
+    """Wait for pending writes and close the output sink (if any). Call once after the last sample."""
+    global _output_sink
+    if _output_sink is not None:
+        sink, _output_sink = _output_sink, None
+        try:
+            sink.close()
+        finally:
+            _drain(sink)
+
 
-        xml_filename = f"img_{i:05d}.xml"
-        save_xml_label(xml_content, os.path.join(XML_DIR, xml_filename))
+def collect_writes() -> tuple[list[str], list[tuple[str, BaseException]]]:
+    """
+    Keys of the samples stored since the last call, and (key, error) of the
+    samples whose write failed since. With writer threads, a sample is only
+    stored some time after `generate_sample` returned; call this again after
+    `close_outputs` for the last ones.
+    """
+    global _written_keys, _failed_writes
+    if _output_sink is not None:
+        _drain(_output_sink)
+    written, _written_keys = _written_keys, []
+    failed, _failed_writes = _failed_writes, []
+    return written, failed
+
+
+def _drain(sink: OutputSink) -> None:
+    if isinstance(sink, AsyncSink):
+        written, failed = sink.collect()
+        _written_keys.extend(written)
+        _failed_writes.extend(failed)
+
+
+if __name__ == "__main__":
+    sys.argv = sys.argv[1:]
 
-        print(f"Saved {image_filename} and {label_filename} and {xml_filename}")
+    _from = int(sys.argv[0])
+    _to = int(sys.argv[1])
+    _step = int(sys.argv[2])
+
+    sample_index = open_sample_index(SAMPLE_INDEX_FILE)
+    pending = {}  # key -> (index, stats) of the samples not stored yet
+    failures = 0
+
+    def report_writes() -> None:
+        global failures
+        written, failed = collect_writes()
+        for key in written:
+            i, stats = pending.pop(key)
+            if sample_index is not None:
+                sample_index.append(i, stats)
+            print(f"Saved {stats['image']} and {key}.txt and {key}.xml "
+                  f"({stats['words_drawn']} words drawn, {stats['words_discarded']} of {stats['words_sampled']} sampled discarded)")
+        for key, error in failed:
+            pending.pop(key)
+            failures += 1
+            print(f"Failed to write {key}: {type(error).__name__}: {error}", file=sys.stderr)
+
+    for i in range(_from, _to, _step):
+        stats = {}
+        with stage("sample"):
+            generate_sample(i, stats)
+        pending[sample_key(i)] = (i, stats)
+        report_writes()
+
+    close_outputs()
+    report_writes()
+    if sample_index is not None:
+        sample_index.close()
+    encoded = IMAGE_ENCODER.stats()
+    if encoded["images"]:
+        print(f"Encoded {encoded['images']} images ({encoded['reused']} reused JPEGs): "
+              f"{encoded['seconds'] / encoded['images'] * 1000:.1f} ms/img on average, "
+              f"{encoded['max_seconds'] * 1000:.1f} ms max, {encoded['bytes'] / encoded['images'] / 1024:.0f} KB/img")
+    if profiling_enabled():
+        print(format_table(profile_snapshot()))
+    if failures:
+        sys.exit(1)